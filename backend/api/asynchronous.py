@@ -0,0 +1,107 @@
+"""Асинхронные представления и параллельные запросы под ASGI."""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import update_wrapper, wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from core.constants import CONCURRENT_QUERY_THREADS
+
+from .connections import check_connections, connection_stats
+from .metrics import counting_queries
+
+query_executor = ThreadPoolExecutor(
+    max_workers=CONCURRENT_QUERY_THREADS, thread_name_prefix='query'
+)
+
+
+def closing_connections(func):
+    """func, закрывающая устаревшие соединения потока до и после вызова.
+
+    Так Django поступает с соединением потока запроса по сигналам
+    request_started и request_finished; перед вызовом соединения еще
+    и проверяются, как в check_db_connections. Запросы потока входят
+    в метрики запроса, если они включены.
+    """
+    @wraps(func)
+    def run(*args, **kwargs):
+        close_old_connections()
+        check_connections()
+        try:
+            with counting_queries():
+                return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return run
+
+
+def database_sync_to_async(func):
+    """Корутина, выполняющая func в общем пуле потоков."""
+    return sync_to_async(closing_connections(func), thread_sensitive=False)
+
+
+def run_concurrently(*funcs):
+    """Результаты независимых функций с запросами к базе.
+
+    При ASYNC_VIEWS и постоянных соединениях функции выполняются
+    одновременно в отдельном пуле потоков, у каждого потока свое
+    соединение. Пул не общий с представлениями, иначе занятые ими
+    потоки ждали бы друг друга. Без CONN_MAX_AGE каждый поток открывал
+    бы новое соединение, это дороже самих запросов, поэтому функции
+    выполняются по очереди. Потоки получают копию контекста, чтобы
+    их запросы вошли в метрики запроса.
+    """
+    if not (settings.ASYNC_VIEWS
+            and connection.settings_dict['CONN_MAX_AGE']):
+        return [func() for func in funcs]
+    submitted = time.perf_counter()
+
+    def waited(func):
+        def run():
+            connection_stats.add_wait(time.perf_counter() - submitted)
+            return func()
+        return closing_connections(run)
+
+    futures = [
+        query_executor.submit(copy_context().run, waited(func))
+        for func in funcs
+    ]
+    return [future.result() for future in futures]
+
+
+class AsyncViewSetMixin:
+    """ViewSet как корутина при settings.ASYNC_VIEWS.
+
+    В Django 3.2 синхронные представления под ASGI выполняются в одном
+    потоке процесса, и медленный запрос к базе задерживает все
+    остальные. Здесь запрос целиком обрабатывается в общем пуле
+    потоков, ответ рендерится там же, а потоковый ответ читается до
+    конца: ASGIHandler перебирает его в цикле событий, где запросы
+    к базе запрещены.
+    """
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        """Корутина вместо функции при ASYNC_VIEWS."""
+        view = super().as_view(actions, **initkwargs)
+        if not settings.ASYNC_VIEWS:
+            return view
+
+        def respond(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if response.streaming:
+                response.streaming_content = list(response.streaming_content)
+            elif callable(getattr(response, 'render', None)):
+                response.render()
+            return response
+
+        handler = database_sync_to_async(respond)
+
+        async def async_view(request, *args, **kwargs):
+            return await handler(request, *args, **kwargs)
+
+        return update_wrapper(async_view, view)
@@ -0,0 +1,290 @@
+"""Кэширование справочных данных, принадлежности рецептов и ответов."""
+import hashlib
+import time
+from collections import namedtuple
+from functools import partial
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import Http404
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.response import Response
+
+from recipes.models import FavoriteRecipes, ShoppingCart
+from users.models import Subscriptions
+
+
+class SharedCache:
+    """Общий кэш Django с ключами prefix:... и версиями данных.
+
+    Версия хранится в кэше без срока и входит в ключи данных, поэтому
+    смена версии делает все старые данные недоступными.
+    """
+
+    def __init__(self, alias_setting, prefix):
+        """Кэш из настройки alias_setting с ключами, начинающимися с prefix."""
+        self.alias_setting = alias_setting
+        self.prefix = prefix
+
+    @property
+    def cache(self):
+        """Общий кэш."""
+        return caches[getattr(settings, self.alias_setting)]
+
+    def key(self, *parts):
+        """Ключ prefix:part:..."""
+        return ':'.join(str(part) for part in (self.prefix, *parts))
+
+    def set_version(self, *parts):
+        """Записать новую версию данных parts."""
+        version = time.time_ns()
+        self.cache.set(self.key(*parts, 'version'), version, None)
+        return version
+
+    def get_version(self, *parts):
+        """Текущая версия данных parts."""
+        version = self.cache.get(self.key(*parts, 'version'))
+        if version is None:
+            version = self.set_version(*parts)
+        return version
+
+    def bump(self, *parts):
+        """Новая версия данных parts после коммита транзакции.
+
+        Иначе параллельный запрос может до коммита собрать данные
+        из старых строк и сохранить их под новой версией.
+        """
+        transaction.on_commit(partial(self.set_version, *parts))
+
+
+class ReferenceDataCache(SharedCache):
+    """Версионируемый кэш сериализованных справочных данных.
+
+    Данные хранятся в памяти процесса и в общем кэше Django. Версия
+    лежит в общем кэше и меняется при любом изменении модели, поэтому
+    в установившемся режиме запросы не обращаются к базе.
+    """
+
+    def __init__(self, name):
+        """Кэш с ключами, начинающимися с name."""
+        super().__init__('REFERENCE_CACHE_ALIAS', f'reference:{name}')
+        self.name = name
+        self.lock = Lock()
+        self.local = None
+
+    def get(self, build):
+        """Данные текущей версии; build() строит их из базы."""
+        version = self.get_version()
+        local = self.local
+        if local is not None and local['version'] == version:
+            return local
+        data_key = self.key(version)
+        with self.lock:
+            data = self.cache.get(data_key)
+            if data is None:
+                data = build()
+                self.cache.set(
+                    data_key, data, settings.REFERENCE_CACHE_TIMEOUT
+                )
+            self.local = {
+                'version': version,
+                'data': data,
+                'index': {item['id']: item for item in data},
+                'etag': quote_etag(f'{self.name}-{version}'),
+                'last_modified': version // 10 ** 9,
+            }
+            return self.local
+
+
+class ReferenceCacheMixin:
+    """Отдача списка и объектов справочника из ReferenceDataCache."""
+
+    reference_cache = None
+
+    def get_cached_reference(self):
+        """Закэшированные данные справочника."""
+        return self.reference_cache.get(
+            lambda: self.get_serializer(
+                self.get_queryset(), many=True
+            ).data
+        )
+
+    def cached_response(self, request, data, cached):
+        """Ответ с ETag/Last-Modified или 304."""
+        response = Response(data)
+        response['ETag'] = cached['etag']
+        response['Last-Modified'] = http_date(cached['last_modified'])
+        return get_conditional_response(
+            request,
+            etag=cached['etag'],
+            last_modified=cached['last_modified'],
+            response=response,
+        )
+
+    def list(self, request, *args, **kwargs):
+        """Список справочника из кэша."""
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        cached = self.get_cached_reference()
+        return self.cached_response(request, cached['data'], cached)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Объект справочника из кэша."""
+        cached = self.get_cached_reference()
+        try:
+            item = cached['index'][int(kwargs[self.lookup_field])]
+        except (KeyError, ValueError):
+            raise Http404
+        return self.cached_response(request, item, cached)
+
+
+Membership = namedtuple('Membership', ('favorites', 'cart', 'subscriptions'))
+EMPTY_MEMBERSHIP = Membership(frozenset(), frozenset(), frozenset())
+
+
+class MembershipCache(SharedCache):
+    """Кэш id избранных рецептов, рецептов в покупках и авторов в подписках.
+
+    Множества небольшие и меняются редко, поэтому хранятся целиком
+    в общем кэше под версией пользователя; запись в избранное, покупки
+    или подписки меняет версию.
+    """
+
+    def __init__(self):
+        """Ключи membership:<id пользователя>:..."""
+        super().__init__('MEMBERSHIP_CACHE_ALIAS', 'membership')
+
+    def build(self, user_id):
+        """Множества из базы."""
+        return Membership(
+            frozenset(FavoriteRecipes.objects.filter(
+                user_id=user_id
+            ).values_list('recipe_id', flat=True)),
+            frozenset(ShoppingCart.objects.filter(
+                user_id=user_id
+            ).values_list('recipe_id', flat=True)),
+            frozenset(Subscriptions.objects.filter(
+                subscriber_id=user_id
+            ).values_list('user_id', flat=True)),
+        )
+
+    def get(self, user):
+        """Множества пользователя; для анонима пустые."""
+        if not user.is_authenticated:
+            return EMPTY_MEMBERSHIP
+        data_key = self.key(user.pk, self.get_version(user.pk))
+        data = self.cache.get(data_key)
+        if data is None:
+            membership = self.build(user.pk)
+            self.cache.set(
+                data_key,
+                tuple(sorted(ids) for ids in membership),
+                settings.MEMBERSHIP_CACHE_TIMEOUT,
+            )
+            return membership
+        return Membership(*(frozenset(ids) for ids in data))
+
+
+class RecipeResponseCache(SharedCache):
+    """Кэш ответов ленты и страниц рецептов для анонимных GET-запросов.
+
+    Ключ страницы рецепта содержит его id и версию, которая удаляется
+    только при изменении этого рецепта. Ключи ленты содержат поколение,
+    которое меняется при любом изменении рецептов. Хост запроса входит
+    в ключи, так как от него зависят абсолютные ссылки на изображения.
+    """
+
+    def __init__(self):
+        """Счетчики попаданий и промахов процесса."""
+        super().__init__('RESPONSE_CACHE_ALIAS', 'response:recipes')
+        self.hits = 0
+        self.misses = 0
+
+    def bump_feed(self):
+        """Новое поколение ленты."""
+        self.bump('feed')
+
+    def detail_key(self, request, pk):
+        """Ключ страницы рецепта с id pk для хоста запроса."""
+        host = hashlib.md5(request.get_host().encode()).hexdigest()
+        return self.key('detail', pk, self.get_version('detail', pk), host)
+
+    def feed_key(self, request):
+        """Ключ страницы ленты по нормализованной строке запроса."""
+        params = sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+        )
+        digest = hashlib.md5(
+            f'{request.get_host()}|{params}'.encode()
+        ).hexdigest()
+        return self.key('feed', self.get_version('feed'), digest)
+
+    def invalidate(self, pks):
+        """После коммита сбрасывает версии рецептов pks и меняет ленту.
+
+        Страницы рецепта для всех хостов становятся недоступны вместе
+        с версией и вытесняются по сроку хранения.
+        """
+        keys = [self.key('detail', pk, 'version') for pk in pks]
+
+        def drop():
+            self.cache.delete_many(keys)
+            self.bump_feed()
+
+        transaction.on_commit(drop)
+
+    def respond(self, request, key, build):
+        """Ответ из кэша или build() с сохранением успешного ответа."""
+        data = self.cache.get(key)
+        if data is not None:
+            self.hits += 1
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        self.misses += 1
+        response = build()
+        if response.status_code == status.HTTP_200_OK:
+            self.cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def stats(self):
+        """Попадания и промахи процесса."""
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+class AnonymousResponseCacheMixin:
+    """Отдача ленты и страниц рецептов анониму из RecipeResponseCache."""
+
+    def list(self, request, *args, **kwargs):
+        """Лента из кэша."""
+        build = partial(super().list, request, *args, **kwargs)
+        if request.user.is_authenticated:
+            return build()
+        return recipe_response_cache.respond(
+            request, recipe_response_cache.feed_key(request), build
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """Страница рецепта из кэша."""
+        build = partial(super().retrieve, request, *args, **kwargs)
+        if request.user.is_authenticated or request.query_params:
+            return build()
+        try:
+            pk = int(kwargs[self.lookup_field])
+        except ValueError:
+            raise Http404
+        return recipe_response_cache.respond(
+            request, recipe_response_cache.detail_key(request, pk), build
+        )
+
+
+tag_cache = ReferenceDataCache('tags')
+ingredient_cache = ReferenceDataCache('ingredients')
+membership_cache = MembershipCache()
+recipe_response_cache = RecipeResponseCache()
@@ -0,0 +1,66 @@
+"""Постоянные соединения с базой: проверка перед использованием и метрики."""
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+
+class ConnectionStats:
+    """Счетчики соединений процесса для /api/_metrics."""
+
+    fields = (
+        'connections_opened',
+        'health_checks',
+        'health_check_failures',
+        'pool_waits',
+        'pool_wait_seconds',
+    )
+
+    def __init__(self):
+        """Нулевые счетчики."""
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(self.fields, 0)
+
+    def add(self, name, value=1):
+        """Увеличить счетчик name."""
+        with self.lock:
+            self.counters[name] += value
+
+    def add_wait(self, seconds):
+        """Ожидание свободного потока с соединением в пуле запросов."""
+        with self.lock:
+            self.counters['pool_waits'] += 1
+            self.counters['pool_wait_seconds'] += seconds
+
+    def snapshot(self):
+        """Текущие значения."""
+        with self.lock:
+            return dict(self.counters)
+
+
+def check_connections():
+    """Закрыть неработающие постоянные соединения потока.
+
+    Соединение, простоявшее дольше DB_HEALTH_CHECK_INTERVAL секунд,
+    проверяется запросом SELECT 1; разорванное сервером или pgbouncer
+    закрывается, и следующий запрос откроет новое, а не упадет.
+    """
+    if not settings.DB_HEALTH_CHECKS:
+        return
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        checked_at = getattr(connection, 'health_checked_at', None)
+        if (checked_at is not None
+                and now - checked_at < settings.DB_HEALTH_CHECK_INTERVAL):
+            continue
+        connection.health_checked_at = now
+        connection_stats.add('health_checks')
+        if not connection.is_usable():
+            connection_stats.add('health_check_failures')
+            connection.close()
+
+
+connection_stats = ConnectionStats()
@@ -0,0 +1,180 @@
+"""Лента рецептов авторов из подписок."""
+import heapq
+import time
+
+from django.db import transaction
+from django.db.models import Count
+
+from core.constants import (FEED_BACKFILL_RECIPES, FEED_FANOUT_MAX_SUBSCRIBERS,
+                            FEED_READ_AUTHORS_TTL)
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscriptions
+
+from .cache import SharedCache, membership_cache
+
+
+class SubscriptionFeed(SharedCache):
+    """Лента подписок: запись при публикации, чтение для популярных авторов.
+
+    Рецепт автора, у которого не больше FEED_FANOUT_MAX_SUBSCRIBERS
+    подписчиков, после коммита записывается в FeedEntry каждого
+    подписчика. Рецепты авторов с большим числом подписчиков читаются
+    при запросе ленты и сливаются с FeedEntry по убыванию id. Список
+    таких авторов пересчитывается раз в FEED_READ_AUTHORS_TTL; автору,
+    опустившемуся ниже порога, ленты подписчиков дополняются его
+    последними рецептами.
+    """
+
+    def __init__(self):
+        """Ключи feed:..."""
+        super().__init__('FEED_CACHE_ALIAS', 'feed')
+        self.read_authors_key = self.key('read-authors')
+
+    def read_authors(self):
+        """id авторов, рецепты которых читаются при запросе ленты.
+
+        Список хранится без срока вместе со временем расчета, чтобы
+        при пересчете знать авторов, вернувшихся к записи при публикации.
+        """
+        state = self.cache.get(self.read_authors_key)
+        if (state is not None
+                and time.time() - state[0] < FEED_READ_AUTHORS_TTL):
+            return frozenset(state[1])
+        authors = frozenset(Subscriptions.objects.values('user_id').annotate(
+            total=Count('id')
+        ).filter(total__gt=FEED_FANOUT_MAX_SUBSCRIBERS).values_list(
+            'user_id', flat=True
+        ))
+        self.cache.set(
+            self.read_authors_key, (time.time(), sorted(authors)), None
+        )
+        if state is not None:
+            self.backfill(frozenset(state[1]) - authors)
+        return authors
+
+    def backfill(self, author_ids):
+        """Последние рецепты авторов в лентах всех их подписчиков.
+
+        Пока автор читался при запросе ленты, его рецепты в FeedEntry
+        не записывались.
+        """
+        for author_id in author_ids:
+            recipe_ids = [
+                entry.recipe_id
+                for entry in self.recent_entries(None, author_id)
+            ]
+            FeedEntry.objects.bulk_create(
+                (
+                    FeedEntry(user_id=subscriber_id, recipe_id=recipe_id)
+                    for subscriber_id in Subscriptions.objects.filter(
+                        user_id=author_id
+                    ).values_list('subscriber_id', flat=True).iterator()
+                    for recipe_id in recipe_ids
+                ),
+                batch_size=1000,
+                ignore_conflicts=True,
+            )
+
+    def publish(self, recipe):
+        """Записать новый рецепт в ленты подписчиков после коммита.
+
+        Автор проверяется после коммита, чтобы рецепт, сохраненный
+        одновременно с пересчетом списка авторов, не пропал из лент.
+        """
+
+        def fan_out():
+            if recipe.author_id in self.read_authors():
+                return
+            FeedEntry.objects.bulk_create(
+                (
+                    FeedEntry(user_id=subscriber_id, recipe_id=recipe.pk)
+                    for subscriber_id in Subscriptions.objects.filter(
+                        user_id=recipe.author_id
+                    ).values_list('subscriber_id', flat=True).iterator()
+                ),
+                batch_size=1000,
+                ignore_conflicts=True,
+            )
+
+        transaction.on_commit(fan_out)
+
+    def recent_entries(self, subscriber_id, author_id):
+        """FeedEntry последних рецептов автора для подписчика."""
+        return [
+            FeedEntry(user_id=subscriber_id, recipe_id=recipe_id)
+            for recipe_id in Recipe.objects.filter(
+                author_id=author_id
+            ).order_by('-id').values_list(
+                'pk', flat=True
+            )[:FEED_BACKFILL_RECIPES]
+        ]
+
+    def follow(self, subscriber_id, author_id):
+        """Добавить в ленту последние рецепты нового автора."""
+        if author_id in self.read_authors():
+            return
+        FeedEntry.objects.bulk_create(
+            self.recent_entries(subscriber_id, author_id),
+            ignore_conflicts=True,
+        )
+
+    def unfollow(self, subscriber_id, author_id):
+        """Убрать из ленты рецепты автора."""
+        FeedEntry.objects.filter(
+            user_id=subscriber_id, recipe__author_id=author_id
+        ).delete()
+
+    def page(self, user, before, size):
+        """До size id рецептов ленты с id меньше before, новые сверху."""
+        entries = FeedEntry.objects.filter(user=user)
+        if before is not None:
+            entries = entries.filter(recipe_id__lt=before)
+        streams = [
+            entries.order_by('-recipe_id').values_list(
+                'recipe_id', flat=True
+            )[:size]
+        ]
+        authors = (
+            self.read_authors() & membership_cache.get(user).subscriptions
+        )
+        if authors:
+            recipes = Recipe.objects.filter(author_id__in=authors)
+            if before is not None:
+                recipes = recipes.filter(pk__lt=before)
+            streams.append(
+                recipes.order_by('-id').values_list('pk', flat=True)[:size]
+            )
+        ids = []
+        for pk in heapq.merge(*streams, reverse=True):
+            if ids and ids[-1] == pk:
+                continue
+            ids.append(pk)
+            if len(ids) == size:
+                break
+        return ids
+
+    @transaction.atomic
+    def rebuild(self):
+        """Пересобрать ленты всех пользователей."""
+        self.cache.delete(self.read_authors_key)
+        read_authors = self.read_authors()
+        FeedEntry.objects.all().delete()
+        recent = {}
+        entries = []
+        for subscriber_id, author_id in Subscriptions.objects.exclude(
+            user_id__in=read_authors
+        ).values_list('subscriber_id', 'user_id').iterator():
+            if author_id not in recent:
+                recent[author_id] = [
+                    entry.recipe_id
+                    for entry in self.recent_entries(None, author_id)
+                ]
+            entries.extend(
+                FeedEntry(user_id=subscriber_id, recipe_id=recipe_id)
+                for recipe_id in recent[author_id]
+            )
+        FeedEntry.objects.bulk_create(entries, batch_size=1000)
+        return len(entries)
+
+
+subscription_feed = SubscriptionFeed()
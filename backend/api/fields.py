@@ -0,0 +1,69 @@
+"""Кастомные поля сериализаторов."""
+import base64
+import binascii
+
+from django.core.files.storage import default_storage
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
+from rest_framework import serializers
+
+from core.images import (ImageUpload, open_image, save_image, store_upload,
+                         upload_extension, variant_names)
+
+
+class ProcessedImageField(Base64ImageField):
+    """Base64-изображение, сохраняемое через core.images.save_image.
+
+    При валидации изображение только декодируется и проверяется, а
+    в хранилище его записывает store() из create/update сериализатора,
+    поэтому запрос с ошибками валидации не оставляет файлов. Изображение
+    декодируется один раз, очищается от метаданных, уменьшается
+    и сохраняется под именем-хэшем вместе с вариантами. С background=True
+    сохраняется только исходный файл, а обработку выполняет api.tasks.
+    """
+
+    def __init__(self, *args, upload_to='', background=False, **kwargs):
+        """upload_to - каталог для файлов."""
+        self.upload_to = upload_to
+        self.background = background
+        super().__init__(*args, **kwargs)
+
+    def to_internal_value(self, base64_data):
+        """Проверенное несохраненное изображение ImageUpload."""
+        if base64_data in self.EMPTY_VALUES:
+            return None
+        if not isinstance(base64_data, str):
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        if ';base64,' in base64_data:
+            base64_data = base64_data.split(';base64,')[1]
+        try:
+            data = base64.b64decode(base64_data)
+            if self.background:
+                upload_extension(data)
+                return ImageUpload(data)
+            return ImageUpload(data, open_image(data))
+        except (TypeError, binascii.Error, ValueError, OSError,
+                Image.DecompressionBombError):
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+
+    def store(self, upload):
+        """Сохранить ImageUpload, возвращает имя файла."""
+        data = upload.read()
+        if self.background:
+            return store_upload(data, self.upload_to)
+        return save_image(data, self.upload_to, upload.image)
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Ссылки на уменьшенные варианты изображения."""
+
+    def to_representation(self, value):
+        """Словарь {ширина или thumbnail: url}."""
+        request = self.context.get('request')
+        urls = {}
+        for key, name in variant_names(value.name).items():
+            url = default_storage.url(name)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[key] = url
+        return urls
@@ -1,13 +1,52 @@
 """Кастомные фильтры."""
+from collections import defaultdict
+
 import django_filters
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import (Case, Exists, F, FloatField, IntegerField,
+                              OuterRef, Value, When)
 from django_filters.rest_framework import filters
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+
+from core.constants import (RECIPE_COVERAGE_MAX_INGREDIENTS,
+                            RECIPE_SEARCH_CONFIG)
+from recipes.models import (FavoriteRecipes, Ingredient, Recipe, ShoppingCart,
+                            Tag)
 
-from recipes.models import Recipe, Tag
+from .search import recipe_search
 
 User = get_user_model()
 
 
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    """Список чисел через запятую."""
+
+
+class IngredientFilter(django_filters.FilterSet):
+    """Поиск ингредиентов по названию."""
+
+    name = filters.CharFilter(method='filter_name')
+
+    class Meta:
+        """:)."""
+
+        model = Ingredient
+        fields = ('name',)
+
+    def filter_name(self, queryset, name, value):
+        """Совпадения по началу названия выше совпадений по вхождению."""
+        return queryset.filter(name__icontains=value).annotate(
+            search_rank=Case(
+                When(name__istartswith=value, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        ).order_by('search_rank', 'name')
+
+
 class RecipeFilter(django_filters.FilterSet):
     """Фильтрация рецептов."""
 
@@ -15,6 +54,7 @@ class RecipeFilter(django_filters.FilterSet):
         field_name='tags__slug',
         queryset=Tag.objects.all(),
         to_field_name='slug',
+        method='filter_tags',
     )
     author = filters.ModelChoiceFilter(
         field_name='author',
@@ -29,26 +69,130 @@ class RecipeFilter(django_filters.FilterSet):
         method="filter_is_favorited",
     )
 
+    search = filters.CharFilter(method='filter_search')
+
+    have = NumberInFilter(method='filter_have')
+
     class Meta:
         """:)."""
 
         model = Recipe
-        fields = ('author', 'tags', 'is_in_shopping_cart', 'is_favorited')
+        fields = (
+            'author',
+            'tags',
+            'is_in_shopping_cart',
+            'is_favorited',
+            'search',
+            'have',
+        )
+
+    @staticmethod
+    def filter_exists(queryset, model, user, value):
+        """Фильтр по наличию связи пользователя с рецептом без JOIN."""
+        if not user.is_authenticated:
+            return queryset
+        exists = Exists(model.objects.filter(user=user, recipe=OuterRef('pk')))
+        return queryset.filter(exists if value else ~exists)
+
+    def filter_tags(self, queryset, name, value):
+        """Рецепты хотя бы с одним из тэгов (полусоединение)."""
+        if not value:
+            return queryset
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'), tag__in=value
+        )))
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         """Фильтр наличия рецепта в списке покупок."""
-        user = self.request.user
-        if user.is_authenticated:
-            if value:
-                return queryset.filter(shoppingcart__user=user).distinct()
-            return queryset.exclude(shoppingcart__user=user).distinct()
-        return queryset
+        return self.filter_exists(
+            queryset, ShoppingCart, self.request.user, value
+        )
 
     def filter_is_favorited(self, queryset, name, value):
         """Фильтр наличия рецепта в избранных."""
-        user = self.request.user
-        if user.is_authenticated:
-            if value:
-                return queryset.filter(favoriterecipes__user=user).distinct()
-            return queryset.exclude(favoriterecipes__user=user).distinct()
-        return queryset
+        return self.filter_exists(
+            queryset, FavoriteRecipes, self.request.user, value
+        )
+
+    def filter_search(self, queryset, name, value):
+        """Поиск по названию, ингредиентам и описанию; вес в search_rank.
+
+        На PostgreSQL - по SearchVectorField с GIN-индексом, иначе -
+        по инвертированному индексу в памяти. Найденные рецепты не
+        ограничиваются числом: остальные фильтры и пагинация применяются
+        к ним так же, как к результату SearchQuery.
+        """
+        if connection.vendor == 'postgresql':
+            query = SearchQuery(value, config=RECIPE_SEARCH_CONFIG)
+            return queryset.filter(search_document__vector=query).annotate(
+                search_rank=SearchRank(F('search_document__vector'), query)
+            )
+        found = defaultdict(list)
+        for pk, score in recipe_search.index.search(value).items():
+            found[score].append(pk)
+        return queryset.filter(
+            pk__in=[pk for ids in found.values() for pk in ids]
+        ).annotate(search_rank=Case(
+            *(When(pk__in=ids, then=Value(float(score)))
+              for score, ids in found.items()),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ))
+
+    def filter_have(self, queryset, name, value):
+        """Рецепты хотя бы с одним из ингредиентов value.
+
+        Число недостающих ингредиентов - в missing_ingredients, берется
+        из индекса ингредиент -> рецепты в памяти. Фильтр объявлен
+        последним, поэтому покрытие считается только для рецептов,
+        прошедших остальные фильтры.
+        """
+        have = {
+            int(ingredient_id) for ingredient_id in value
+            if ingredient_id is not None
+        }
+        if len(have) > RECIPE_COVERAGE_MAX_INGREDIENTS:
+            raise ValidationError({'have': [
+                f'Не больше {RECIPE_COVERAGE_MAX_INGREDIENTS} ингредиентов.'
+            ]})
+        allowed = None
+        if queryset.query.has_filters():
+            allowed = set(queryset.values_list('pk', flat=True))
+        found = defaultdict(list)
+        for pk, missing in recipe_search.coverage.search(
+            have, allowed
+        ).items():
+            found[missing].append(pk)
+        return queryset.filter(
+            pk__in=[pk for ids in found.values() for pk in ids]
+        ).annotate(missing_ingredients=Case(
+            *(When(pk__in=ids, then=Value(missing))
+              for missing, ids in found.items()),
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    """Сортировка рецептов с id в качестве последнего ключа."""
+
+    def get_ordering(self, request, queryset, view):
+        """Добавляет -id, чтобы порядок страниц был однозначным.
+
+        Без явной сортировки при подборе по продуктам - сначала рецепты
+        с меньшим числом недостающих ингредиентов, при поиске - по
+        убыванию search_rank.
+        """
+        if self.ordering_param not in request.query_params:
+            ordering = tuple(
+                field for param, field in (
+                    ('have', 'missing_ingredients'),
+                    ('search', '-search_rank'),
+                ) if request.query_params.get(param, '').strip()
+            )
+            if ordering:
+                return (*ordering, '-id')
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and not {'id', '-id'} & set(ordering):
+            ordering = (*ordering, '-id')
+        return ordering
@@ -0,0 +1,101 @@
+"""Совместимость и скорость FastJSONRenderer и FastJSONParser."""
+import io
+import time
+
+from django.core.management.base import CommandError
+from django.test.utils import override_settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer, orjson
+
+from . import run_benchmark
+
+
+class Command(run_benchmark.Command):
+    help = (
+        'Рендерит данные ответа каждого сценария run_benchmark через '
+        'JSONRenderer и FastJSONRenderer и сравнивает байты, затем '
+        'сравнивает время кодирования и разбора страницы из --limit '
+        'рецептов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--user', help='email пользователя.')
+
+    def check_compatibility(self, scenarios):
+        """Одинаковый JSON у обоих рендереров для всех ответов."""
+        old, new = JSONRenderer(), FastJSONRenderer()
+        checked = 0
+        for name, (client, method, path, params) in scenarios.items():
+            for request_method in method.split('+'):
+                response = getattr(client, request_method)(
+                    path, params if request_method == 'get' else None
+                )
+                if getattr(response, 'data', None) is None:
+                    continue
+                args = (
+                    response.data,
+                    response.accepted_media_type,
+                    response.renderer_context,
+                )
+                expected = old.render(*args)
+                if new.render(*args) != expected:
+                    raise CommandError(f'JSON сценария {name} отличается.')
+                parsed = FastJSONParser().parse(io.BytesIO(expected))
+                if parsed != JSONParser().parse(io.BytesIO(expected)):
+                    raise CommandError(f'Разбор сценария {name} отличается.')
+                checked += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Совпадают {checked} ответов {len(scenarios)} сценариев.'
+        ))
+
+    def best(self, function, repeat):
+        """Лучшее время из repeat запусков."""
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError('orjson не установлен, сравнивать не с чем.')
+        user = self.get_user(options['user'])
+        self.anon = APIClient()
+        self.auth = APIClient()
+        self.auth.force_authenticate(user)
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            self.check_compatibility(self.get_scenarios(user))
+            response = self.auth.get(
+                '/api/recipes/', {'limit': options['limit']}
+            )
+        data = response.data
+        body = JSONRenderer().render(data)
+        repeat = options['repeat']
+        results = (
+            ('кодирование, json', self.best(
+                lambda: JSONRenderer().render(data), repeat
+            )),
+            ('кодирование, orjson', self.best(
+                lambda: FastJSONRenderer().render(data), repeat
+            )),
+            ('разбор, json', self.best(
+                lambda: JSONParser().parse(io.BytesIO(body)), repeat
+            )),
+            ('разбор, orjson', self.best(
+                lambda: FastJSONParser().parse(io.BytesIO(body)), repeat
+            )),
+        )
+        self.stdout.write(
+            f'Страница из {len(data["results"])} рецептов, '
+            f'{len(body)} байт:'
+        )
+        for title, elapsed in results:
+            self.stdout.write(f'{title:22} {elapsed * 1000:8.3f} мс')
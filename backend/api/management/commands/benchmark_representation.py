@@ -0,0 +1,116 @@
+"""Сравнение RecipeReadSerializer и RecipeRepresentation."""
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.representations import RecipeRepresentation
+from api.serializers import RecipeReadSerializer
+from api.views import RecipeViewSet
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет, что RecipeRepresentation дает тот же JSON, что '
+        'и RecipeReadSerializer, и сравнивает время на рецепт: только '
+        'CPU (данные уже загружены) и вместе с запросами к базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--user', help='email пользователя.')
+
+    def get_request(self, email):
+        """GET-запрос ленты от пользователя или анонима."""
+        request = APIRequestFactory().get('/api/recipes/')
+        user = AnonymousUser()
+        if email:
+            user = User.objects.filter(email=email).first()
+            if user is None:
+                raise CommandError(f'Пользователь {email} не найден.')
+        force_authenticate(request, user=user)
+        request = Request(request)
+        request.user = user
+        return request
+
+    def timed(self, function, repeat):
+        """Лучшее время из repeat запусков function."""
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def handle(self, *args, **options):
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            self.compare(options)
+
+    def compare(self, options):
+        """Проверка совпадения JSON и замеры."""
+        count = options['recipes']
+        request = self.get_request(options['user'])
+        renderer = JSONRenderer()
+        queryset = RecipeViewSet().get_queryset()
+        instances = list(queryset[:count])
+        rows = list(RecipeRepresentation.queryset()[:count])
+        if not rows:
+            raise CommandError('Нет рецептов, запустите seed_benchmark.')
+        loaded = RecipeRepresentation(request)
+        loaded.load(rows)
+
+        def serializer_data(recipes):
+            return RecipeReadSerializer(
+                recipes, many=True, context={'request': request}
+            ).data
+
+        def representation_data():
+            representation = RecipeRepresentation(request)
+            representation.tags = loaded.tags
+            representation.ingredients = loaded.ingredients
+            return representation.build(rows)
+
+        expected = serializer_data(instances)
+        actual = representation_data()
+        for old, new in zip(expected, actual):
+            if renderer.render(old) != renderer.render(new):
+                raise CommandError(
+                    f'JSON рецепта {old["id"]} отличается:\n'
+                    f'{renderer.render(old).decode()}\n'
+                    f'{renderer.render(new).decode()}'
+                )
+        if renderer.render(expected) != renderer.render(actual):
+            raise CommandError('JSON списков отличается.')
+        self.stdout.write(self.style.SUCCESS(
+            f'JSON {len(rows)} рецептов совпадает побайтно.'
+        ))
+        repeat = options['repeat']
+        results = (
+            ('CPU, сериализатор', self.timed(
+                lambda: serializer_data(instances), repeat
+            )),
+            ('CPU, представление', self.timed(representation_data, repeat)),
+            ('с запросами, сериализатор', self.timed(
+                lambda: serializer_data(list(queryset.all()[:count])),
+                repeat,
+            )),
+            ('с запросами, представление', self.timed(
+                lambda: RecipeRepresentation(request).represent(
+                    RecipeRepresentation.queryset()[:count]
+                ),
+                repeat,
+            )),
+        )
+        for title, elapsed in results:
+            self.stdout.write(
+                f'{title:30} {elapsed * 1e6 / len(rows):8.1f} мкс/рецепт'
+            )
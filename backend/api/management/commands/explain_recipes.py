@@ -0,0 +1,92 @@
+"""Планы запросов ленты рецептов и подписок для разных фильтров."""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import RecipeViewSet
+from recipes.models import Tag
+from users.models import Subscriptions
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Печатает EXPLAIN (ANALYZE на PostgreSQL) запросов ленты рецептов '
+        'для каждой комбинации фильтров. Запустите до и после миграции '
+        'с индексами, чтобы сравнить планы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='email пользователя, от имени которого строятся запросы.',
+        )
+
+    def get_user(self, email):
+        """Пользователь с наибольшим числом избранных рецептов."""
+        if email:
+            try:
+                return User.objects.get(email=email)
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь {email} не найден.')
+        user = User.objects.annotate(
+            favorites=Count('favoriterecipes')
+        ).order_by('-favorites').first()
+        if user is None:
+            raise CommandError('В базе нет пользователей.')
+        return user
+
+    def get_filter_combinations(self, user):
+        """Параметры запроса для каждой комбинации фильтров."""
+        tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+        author = Subscriptions.objects.filter(
+            subscriber=user
+        ).values_list('user', flat=True).first() or user.pk
+        return {
+            'feed': {},
+            'author': {'author': author},
+            'tags': {'tags': tags},
+            'is_favorited': {'is_favorited': 1},
+            'is_in_shopping_cart': {'is_in_shopping_cart': 1},
+            'tags+is_favorited': {'tags': tags, 'is_favorited': 1},
+            'author+is_in_shopping_cart': {
+                'author': author, 'is_in_shopping_cart': 1
+            },
+        }
+
+    def explain(self, title, queryset):
+        """Печать плана запроса."""
+        options = {}
+        if connection.vendor == 'postgresql':
+            options = {'analyze': True, 'buffers': True}
+        self.stdout.write(self.style.MIGRATE_HEADING(f'== {title}'))
+        self.stdout.write(queryset.explain(**options))
+        self.stdout.write('')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        factory = APIRequestFactory()
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        for title, params in self.get_filter_combinations(user).items():
+            request = factory.get('/api/recipes/', params)
+            force_authenticate(request, user=user)
+            viewset = RecipeViewSet(
+                action_map={'get': 'list'}, format_kwarg=None, kwargs={}
+            )
+            viewset.request = viewset.initialize_request(request)
+            queryset = viewset.filter_queryset(viewset.get_queryset())
+            self.explain(title, queryset[:page_size])
+        self.explain(
+            'subscriptions',
+            User.objects.filter(subscribers__subscriber=user)[:page_size]
+        )
+        self.explain(
+            'is_subscribed',
+            Subscriptions.objects.filter(
+                user=user, subscriber=user
+            ).values('pk')[:1]
+        )
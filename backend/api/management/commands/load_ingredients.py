@@ -0,0 +1,140 @@
+"""Загрузка ингредиентов из CSV или JSON."""
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.cache import ingredient_cache
+from api.search import ingredient_index
+from core.constants import INGR_NAME_MAX_LENGHT, INGR_UNIT_MAX_LENGHT
+from recipes.models import Ingredient
+
+COPY_SQL = (
+    'COPY ingredient_staging (name, measurement_unit) '
+    'FROM STDIN WITH (FORMAT csv)'
+)
+
+
+class CSVStream:
+    """Файлоподобный объект, отдающий строки CSV по мере чтения."""
+
+    def __init__(self, rows):
+        """Поток из строк (name, measurement_unit)."""
+        self.writer = csv.writer(self)
+        self.rows = iter(rows)
+        self.buffer = ''
+
+    def write(self, value):
+        """Запись csv.writer попадает в буфер."""
+        self.buffer += value
+
+    def read(self, size=-1):
+        """Прочитать не больше size символов."""
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(row)
+        if size < 0:
+            size = len(self.buffer)
+        chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+        return chunk
+
+
+class Command(BaseCommand):
+    help = 'Загрузка ингредиентов из CSV (name,unit) или JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=settings.BASE_DIR.parent / 'data' / 'ingredients.csv',
+            type=Path,
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY даже на PostgreSQL.',
+        )
+
+    def read_rows(self, path):
+        """Строки (name, measurement_unit) из файла."""
+        with open(path, encoding='utf-8') as file:
+            if path.suffix == '.json':
+                items = (
+                    (item['name'], item['measurement_unit'])
+                    for item in json.load(file)
+                )
+            else:
+                items = csv.reader(file)
+            for item in items:
+                if len(item) < 2:
+                    self.skipped += 1
+                    continue
+                name, unit = item[0].strip(), item[1].strip()
+                if (not name or len(name) > INGR_NAME_MAX_LENGHT
+                        or len(unit) > INGR_UNIT_MAX_LENGHT):
+                    self.skipped += 1
+                    continue
+                self.read += 1
+                yield name, unit
+
+    def load_bulk(self, rows, batch_size):
+        """Загрузка пачками через bulk_create."""
+        before = Ingredient.objects.count()
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            Ingredient.objects.bulk_create(
+                (Ingredient(name=name, measurement_unit=unit)
+                 for name, unit in batch),
+                ignore_conflicts=True,
+            )
+        return Ingredient.objects.count() - before
+
+    def load_copy(self, rows):
+        """Загрузка через COPY во временную таблицу."""
+        table = Ingredient._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_staging '
+                f'(name varchar({INGR_NAME_MAX_LENGHT}), '
+                f'measurement_unit varchar({INGR_UNIT_MAX_LENGHT})) '
+                'ON COMMIT DROP'
+            )
+            cursor.copy_expert(COPY_SQL, CSVStream(rows))
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT ON (name) name, measurement_unit '
+                'FROM ingredient_staging '
+                'ON CONFLICT (name) DO NOTHING'
+            )
+            return cursor.rowcount
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not path.exists():
+            raise CommandError(f'Файл {path} не найден.')
+        self.read = self.skipped = 0
+        rows = self.read_rows(path)
+        started = time.perf_counter()
+        with transaction.atomic():
+            if connection.vendor == 'postgresql' and not options['no_copy']:
+                created = self.load_copy(rows)
+            else:
+                created = self.load_bulk(rows, options['batch_size'])
+        elapsed = time.perf_counter() - started
+        ingredient_cache.bump()
+        ingredient_index.reset()
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано {self.read}, добавлено {created}, '
+            f'пропущено {self.skipped} за {elapsed:.2f} с '
+            f'({self.read / max(elapsed, 1e-6):.0f} строк/с).'
+        ))
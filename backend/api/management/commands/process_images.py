@@ -0,0 +1,27 @@
+"""Обработка изображений рецептов, оставшихся в очереди."""
+from django.core.management.base import BaseCommand
+
+from api.tasks import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Обработка изображений рецептов в состоянии pending.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--failed',
+            action='store_true',
+            help='Повторить также неудачные попытки.',
+        )
+
+    def handle(self, *args, **options):
+        statuses = [Recipe.ImageStatus.PENDING]
+        if options['failed']:
+            statuses.append(Recipe.ImageStatus.FAILED)
+        recipes = Recipe.objects.filter(
+            image_status__in=statuses
+        ).values_list('pk', 'image')
+        for recipe_id, raw_name in recipes.iterator():
+            process_recipe_image(recipe_id, raw_name)
+        self.stdout.write(self.style.SUCCESS('Изображения обработаны.'))
@@ -0,0 +1,22 @@
+"""Пересборка лент подписок."""
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.feed import subscription_feed
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает ленты подписок всех пользователей. Нужна после '
+        'загрузки подписок или рецептов в обход моделей и после смены '
+        'FEED_FANOUT_MAX_SUBSCRIBERS.'
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        created = subscription_feed.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {created} за '
+            f'{time.perf_counter() - started:.1f} с.'
+        ))
@@ -0,0 +1,35 @@
+"""Пересчет счетчиков избранного и списков покупок у рецептов."""
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import FavoriteRecipes, Recipe, ShoppingCart
+
+
+def count_subquery(model):
+    """Количество записей model для рецепта."""
+    return Coalesce(Subquery(
+        model.objects.filter(recipe=OuterRef('pk')).order_by().values(
+            'recipe'
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = 'Пересчет favorites_count и in_carts_count у рецептов.'
+
+    def handle(self, *args, **options):
+        favorites = count_subquery(FavoriteRecipes)
+        in_carts = count_subquery(ShoppingCart)
+        drifted = Recipe.objects.annotate(
+            actual_favorites=favorites, actual_in_carts=in_carts
+        ).exclude(
+            favorites_count=F('actual_favorites'),
+            in_carts_count=F('actual_in_carts'),
+        ).count()
+        Recipe.objects.update(
+            favorites_count=favorites, in_carts_count=in_carts
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлены счетчики у {drifted} рецептов.'
+        ))
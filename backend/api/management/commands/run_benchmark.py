@@ -0,0 +1,288 @@
+"""Замеры задержки и количества запросов эндпоинтов API."""
+import json
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from api.metrics import collect, count_queries, percentile
+from core.constants import BENCHMARK_EMAIL_DOMAIN
+from core.functions import to_base62
+from recipes.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет GET-эндпоинты api/urls.py и пары добавления/удаления '
+        '(избранное, покупки, подписка) через тестовый клиент и пишет '
+        'перцентили задержки и количество SQL-запросов в JSON для '
+        'сравнения между коммитами. Данные: seed_benchmark.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--output', type=Path,
+                            default=Path('benchmark.json'))
+        parser.add_argument('--only', nargs='*', default=(),
+                            help='Имена сценариев для прогона.')
+        parser.add_argument('--user', help='email пользователя.')
+        parser.add_argument(
+            '--compare',
+            type=Path,
+            help='JSON прошлого прогона для сравнения.',
+        )
+
+    def get_user(self, email):
+        """Пользователь замеров с наибольшим числом подписок."""
+        users = User.objects.all()
+        if email:
+            users = users.filter(email=email)
+        else:
+            users = users.filter(
+                email__endswith=f'@{BENCHMARK_EMAIL_DOMAIN}'
+            ).annotate(
+                total=Count('subscribtions')
+            ).order_by('-total')
+        user = users.first()
+        if user is None:
+            raise CommandError(
+                'Пользователь не найден, запустите seed_benchmark.'
+            )
+        return user
+
+    def get_scenarios(self, user):
+        """Сценарии: имя -> (клиент, метод, путь, параметры)."""
+        recipe = Recipe.objects.order_by('-favorites_count').first()
+        free_recipe = Recipe.objects.exclude(
+            favoriterecipes__user=user
+        ).exclude(shoppingcart__user=user).order_by(
+            '-favorites_count'
+        ).first()
+        author = User.objects.exclude(
+            pk=user.pk
+        ).filter(recipes__isnull=False).exclude(
+            subscribers__subscriber=user
+        ).first()
+        tag = Tag.objects.first()
+        ingredient = Ingredient.objects.first()
+        if None in (recipe, free_recipe, author, tag, ingredient):
+            raise CommandError('Нет данных, запустите seed_benchmark.')
+        anon, auth = self.anon, self.auth
+        tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+        return {
+            'tags.list': (anon, 'get', '/api/tags/', {}),
+            'tags.retrieve': (anon, 'get', f'/api/tags/{tag.pk}/', {}),
+            'ingredients.list': (anon, 'get', '/api/ingredients/', {}),
+            'ingredients.search': (
+                anon, 'get', '/api/ingredients/',
+                {'name': ingredient.name[:2]},
+            ),
+            'ingredients.retrieve': (
+                anon, 'get', f'/api/ingredients/{ingredient.pk}/', {}
+            ),
+            'recipes.list.anonymous': (anon, 'get', '/api/recipes/', {}),
+            'recipes.list': (auth, 'get', '/api/recipes/', {}),
+            'recipes.list.limit50': (
+                auth, 'get', '/api/recipes/', {'limit': 50}
+            ),
+            'recipes.list.offset': (
+                auth, 'get', '/api/recipes/', {'offset': 1000}
+            ),
+            'recipes.list.tags': (
+                auth, 'get', '/api/recipes/', {'tags': tags}
+            ),
+            'recipes.list.author': (
+                auth, 'get', '/api/recipes/', {'author': author.pk}
+            ),
+            'recipes.list.is_favorited': (
+                auth, 'get', '/api/recipes/', {'is_favorited': 1}
+            ),
+            'recipes.list.is_in_shopping_cart': (
+                auth, 'get', '/api/recipes/', {'is_in_shopping_cart': 1}
+            ),
+            'recipes.feed': (auth, 'get', '/api/recipes/feed/', {}),
+            'recipes.feed.limit50': (
+                auth, 'get', '/api/recipes/feed/', {'limit': 50}
+            ),
+            'recipes.retrieve.anonymous': (
+                anon, 'get', f'/api/recipes/{recipe.pk}/', {}
+            ),
+            'recipes.retrieve': (
+                auth, 'get', f'/api/recipes/{recipe.pk}/', {}
+            ),
+            'recipes.get_link': (
+                auth, 'get', f'/api/recipes/{recipe.pk}/get-link/', {}
+            ),
+            'recipes.short_link': (
+                anon, 'get', f'/s/{to_base62(recipe.pk)}/', {}
+            ),
+            'recipes.favorite': (
+                auth, 'post+delete',
+                f'/api/recipes/{free_recipe.pk}/favorite/', {},
+            ),
+            'recipes.shopping_cart': (
+                auth, 'post+delete',
+                f'/api/recipes/{free_recipe.pk}/shopping_cart/', {},
+            ),
+            'recipes.download_shopping_cart.txt': (
+                auth, 'get', '/api/recipes/download_shopping_cart/', {}
+            ),
+            'recipes.download_shopping_cart.csv': (
+                auth, 'get', '/api/recipes/download_shopping_cart/',
+                {'file_format': 'csv'},
+            ),
+            'recipes.download_shopping_cart.pdf': (
+                auth, 'get', '/api/recipes/download_shopping_cart/',
+                {'file_format': 'pdf'},
+            ),
+            'users.list': (anon, 'get', '/api/users/', {}),
+            'users.retrieve': (auth, 'get', f'/api/users/{author.pk}/', {}),
+            'users.me': (auth, 'get', '/api/users/me/', {}),
+            'users.subscriptions': (
+                auth, 'get', '/api/users/subscriptions/', {}
+            ),
+            'users.subscriptions.recipes_limit': (
+                auth, 'get', '/api/users/subscriptions/',
+                {'recipes_limit': 3},
+            ),
+            'users.subscribe': (
+                auth, 'post+delete', f'/api/users/{author.pk}/subscribe/', {}
+            ),
+        }
+
+    def request(self, client, method, path, params):
+        """Один запрос; тело потокового ответа читается полностью."""
+        methods = method.split('+')
+        responses = []
+        for name in methods:
+            response = getattr(client, name)(
+                path, params if name == 'get' else None
+            )
+            if response.streaming:
+                size = sum(len(chunk) for chunk in response.streaming_content)
+            else:
+                size = len(response.content)
+            responses.append((response.status_code, size))
+        return responses[0]
+
+    def measure(self, scenario, iterations, warmup):
+        """Перцентили задержки и количество запросов сценария."""
+        for _ in range(warmup):
+            self.request(*scenario)
+        latencies = []
+        queries = []
+        for _ in range(iterations):
+            with collect() as stats, connection.execute_wrapper(
+                count_queries
+            ):
+                started = time.perf_counter()
+                status, size = self.request(*scenario)
+                latencies.append(time.perf_counter() - started)
+            queries.append(stats['queries'])
+        latencies.sort()
+        return {
+            'status': status,
+            'response_size': size,
+            'queries': max(queries),
+            'latency_ms': {
+                'mean': statistics.mean(latencies) * 1000,
+                'min': latencies[0] * 1000,
+                **{
+                    f'p{int(quantile * 100)}':
+                        percentile(latencies, quantile) * 1000
+                    for quantile in (0.5, 0.9, 0.99)
+                },
+                'max': latencies[-1] * 1000,
+            },
+        }
+
+    def get_revision(self):
+        """Текущий коммит, если есть git."""
+        try:
+            return subprocess.run(
+                ('git', 'rev-parse', '--short', 'HEAD'),
+                capture_output=True, text=True, check=True,
+                cwd=settings.BASE_DIR,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def compare(self, path, results):
+        """Разница p50 и количества запросов с прошлым прогоном."""
+        previous = json.loads(path.read_text(encoding='utf-8'))['results']
+        for name, result in results.items():
+            if name not in previous:
+                continue
+            old, new = previous[name], result
+            old_p50 = old['latency_ms']['p50']
+            change = (new['latency_ms']['p50'] - old_p50) / old_p50 * 100
+            queries = new['queries'] - old['queries']
+            self.stdout.write(
+                f'{name:40} p50 {change:+7.1f}% запросов {queries:+d}'
+            )
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        self.anon = APIClient()
+        self.auth = APIClient()
+        self.auth.force_authenticate(user)
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            scenarios = self.get_scenarios(user)
+            unknown = set(options['only']) - set(scenarios)
+            if unknown:
+                raise CommandError(
+                    f'Неизвестные сценарии: {", ".join(sorted(unknown))}.'
+                )
+            for name, scenario in scenarios.items():
+                if options['only'] and name not in options['only']:
+                    continue
+                caches['default'].clear()
+                results[name] = self.measure(
+                    scenario, options['iterations'], options['warmup']
+                )
+                latency = results[name]['latency_ms']
+                self.stdout.write(
+                    f'{name:40} {results[name]["status"]} '
+                    f'q={results[name]["queries"]:<3} '
+                    f'p50={latency["p50"]:8.2f} мс '
+                    f'p99={latency["p99"]:8.2f} мс'
+                )
+        report = {
+            'meta': {
+                'created': datetime.now(timezone.utc).isoformat(),
+                'revision': self.get_revision(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'iterations': options['iterations'],
+                'warmup': options['warmup'],
+                'user': user.email,
+                'recipes': Recipe.objects.count(),
+                'users': User.objects.count(),
+            },
+            'results': results,
+        }
+        options['output'].write_text(
+            json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты записаны в {options["output"]}.'
+        ))
+        if options['compare']:
+            self.compare(options['compare'], results)
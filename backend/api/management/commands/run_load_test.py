@@ -0,0 +1,196 @@
+"""Нагрузочный прогон работающего сервера по HTTP."""
+import http.client
+import json
+import os
+import platform
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+import django
+from django.core.management.base import CommandError
+from django.db import connection
+from rest_framework.authtoken.models import Token
+
+from api.metrics import percentile
+from recipes.models import Ingredient, Recipe
+
+from . import run_benchmark
+
+
+class Command(run_benchmark.Command):
+    help = (
+        'Нагружает запущенный сервер (gunicorn, WSGI или ASGI) --concurrency '
+        'потоками с keep-alive в течение --duration секунд на сценарий '
+        'и пишет запросы в секунду и перцентили задержки в JSON. '
+        'Данные: seed_benchmark в той же базе, что у сервера.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--duration', type=float, default=10.0)
+        parser.add_argument('--label', default='',
+                            help='Описание конфигурации сервера.')
+        parser.add_argument('--output', type=Path,
+                            default=Path('load_test.json'))
+        parser.add_argument('--only', nargs='*', default=(),
+                            help='Имена сценариев для прогона.')
+        parser.add_argument('--user', help='email пользователя.')
+        parser.add_argument(
+            '--compare',
+            type=Path,
+            help='JSON прошлого прогона для сравнения.',
+        )
+
+    def get_load_scenarios(self, user):
+        """Сценарии: имя -> (с токеном, путь с параметрами)."""
+        recipe = Recipe.objects.order_by('-favorites_count').first()
+        ingredient = Ingredient.objects.first()
+        if None in (recipe, ingredient):
+            raise CommandError('Нет данных, запустите seed_benchmark.')
+        search = urlencode({'name': ingredient.name[:2]})
+        return {
+            'tags.list': (False, '/api/tags/'),
+            'users.me': (True, '/api/users/me/'),
+            'ingredients.search': (
+                False, f'/api/ingredients/?{search}'
+            ),
+            'recipes.list.anonymous': (False, '/api/recipes/'),
+            'recipes.list': (True, '/api/recipes/'),
+            'recipes.list.limit50': (True, '/api/recipes/?limit=50'),
+            'recipes.retrieve': (True, f'/api/recipes/{recipe.pk}/'),
+            'recipes.feed': (True, '/api/recipes/feed/'),
+        }
+
+    def worker(self, path, headers, deadline, latencies, errors):
+        """Запросы по одному соединению до deadline."""
+        connection = None
+        while time.perf_counter() < deadline:
+            if connection is None:
+                connection = http.client.HTTPConnection(
+                    self.host, self.port, timeout=30
+                )
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                errors.append('connection')
+                connection.close()
+                connection = None
+                continue
+            latencies.append(time.perf_counter() - started)
+            if response.status >= 400:
+                errors.append(response.status)
+            if response.getheader('Connection', '').lower() == 'close':
+                connection.close()
+                connection = None
+        if connection is not None:
+            connection.close()
+
+    def load(self, path, headers, concurrency, duration):
+        """Запросы в секунду и перцентили задержки сценария."""
+        latencies = []
+        errors = []
+        deadline = time.perf_counter() + duration
+        threads = [
+            threading.Thread(
+                target=self.worker,
+                args=(path, headers, deadline, latencies, errors),
+            )
+            for _ in range(concurrency)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        if not latencies:
+            raise CommandError(f'Сервер не ответил на {path}.')
+        return {
+            'requests': len(latencies),
+            'errors': len(errors),
+            'rps': len(latencies) / elapsed,
+            'latency_ms': {
+                **{
+                    f'p{int(quantile * 100)}':
+                        percentile(latencies, quantile) * 1000
+                    for quantile in (0.5, 0.9, 0.99)
+                },
+                'max': latencies[-1] * 1000,
+            },
+        }
+
+    def compare(self, path, results):
+        """Разница запросов в секунду и p50 с прошлым прогоном."""
+        previous = json.loads(path.read_text(encoding='utf-8'))['results']
+        for name, result in results.items():
+            if name not in previous:
+                continue
+            old, new = previous[name], result
+            rps = (new['rps'] - old['rps']) / old['rps'] * 100
+            old_p50 = old['latency_ms']['p50']
+            p50 = (new['latency_ms']['p50'] - old_p50) / old_p50 * 100
+            self.stdout.write(
+                f'{name:28} rps {rps:+7.1f}% p50 {p50:+7.1f}%'
+            )
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        self.host, self.port = url.hostname, url.port or 80
+        user = self.get_user(options['user'])
+        token, _ = Token.objects.get_or_create(user=user)
+        scenarios = self.get_load_scenarios(user)
+        unknown = set(options['only']) - set(scenarios)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные сценарии: {", ".join(sorted(unknown))}.'
+            )
+        results = {}
+        for name, (authenticated, path) in scenarios.items():
+            if options['only'] and name not in options['only']:
+                continue
+            headers = {'Host': self.host}
+            if authenticated:
+                headers['Authorization'] = f'Token {token.key}'
+            self.load(path, headers, options['concurrency'], 1)
+            results[name] = self.load(
+                path, headers, options['concurrency'], options['duration']
+            )
+            latency = results[name]['latency_ms']
+            self.stdout.write(
+                f'{name:28} {results[name]["rps"]:8.1f} rps '
+                f'err={results[name]["errors"]:<4} '
+                f'p50={latency["p50"]:8.2f} мс '
+                f'p99={latency["p99"]:8.2f} мс'
+            )
+        report = {
+            'meta': {
+                'created': datetime.now(timezone.utc).isoformat(),
+                'revision': self.get_revision(),
+                'label': options['label'],
+                'url': options['url'],
+                'database': connection.vendor,
+                'cpus': os.cpu_count(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'concurrency': options['concurrency'],
+                'duration': options['duration'],
+                'user': user.email,
+            },
+            'results': results,
+        }
+        options['output'].write_text(
+            json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты записаны в {options["output"]}.'
+        ))
+        if options['compare']:
+            self.compare(options['compare'], results)
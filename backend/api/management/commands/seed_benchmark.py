@@ -0,0 +1,235 @@
+"""Синтетические данные для нагрузочных замеров API."""
+import random
+import time
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.cache import ingredient_cache, recipe_response_cache, tag_cache
+from core.constants import BENCHMARK_EMAIL_DOMAIN, BENCHMARK_PASSWORD
+from recipes.models import (FavoriteRecipes, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from users.models import Subscriptions
+
+User = get_user_model()
+
+BENCHMARK_TAGS = (
+    ('Завтрак', 'breakfast'),
+    ('Обед', 'lunch'),
+    ('Ужин', 'dinner'),
+    ('Десерт', 'dessert'),
+    ('Перекус', 'snack'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает пользователей, рецепты, избранное, списки покупок '
+        'и подписки для run_benchmark. Популярность авторов, рецептов '
+        'и ингредиентов распределена по Ципфу с показателем --skew '
+        '(0 - равномерно).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Избранных рецептов на пользователя.')
+        parser.add_argument('--carts', type=int, default=5,
+                            help='Рецептов в покупках на пользователя.')
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help='Подписок на пользователя.')
+        parser.add_argument('--skew', type=float, default=1.1)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--ingredients',
+            type=Path,
+            help=(
+                'Файл для load_ingredients, если ингредиентов в базе нет; '
+                'по умолчанию data/ingredients.csv рядом с backend.'
+            ),
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Удалить ранее созданные данные замеров.',
+        )
+
+    def weights(self, size):
+        """Веса Ципфа для size элементов."""
+        return [1 / (rank + 1) ** self.skew for rank in range(size)]
+
+    def sample(self, population, weights, count):
+        """До count разных элементов с учетом весов."""
+        count = min(count, len(population))
+        chosen = set()
+        for _ in range(count * 10):
+            if len(chosen) >= count:
+                break
+            chosen.update(
+                self.random.choices(population, weights, k=count - len(chosen))
+            )
+        return chosen
+
+    def create_users(self, count):
+        """Пользователи замеров."""
+        password = make_password(BENCHMARK_PASSWORD)
+        start = User.objects.filter(
+            email__endswith=f'@{BENCHMARK_EMAIL_DOMAIN}'
+        ).count()
+        User.objects.bulk_create(
+            (
+                User(
+                    email=f'user{number}@{BENCHMARK_EMAIL_DOMAIN}',
+                    username=f'benchmark{number}',
+                    first_name='Имя',
+                    last_name=f'Фамилия {number}',
+                    password=password,
+                )
+                for number in range(start, start + count)
+            ),
+            batch_size=self.batch_size,
+        )
+        return list(User.objects.filter(
+            email__endswith=f'@{BENCHMARK_EMAIL_DOMAIN}'
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def create_recipes(self, count, authors):
+        """Рецепты авторов с перекосом в пользу первых авторов."""
+        last_id = Recipe.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first() or 0
+        author_ids = self.random.choices(
+            authors, self.weights(len(authors)), k=count
+        )
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author_id=author_id,
+                    name=f'Рецепт {number}',
+                    text='Описание рецепта для замеров. ' * 5,
+                    cooking_time=self.random.randint(5, 120),
+                    image='api/images/benchmark.png',
+                )
+                for number, author_id in enumerate(author_ids)
+            ),
+            batch_size=self.batch_size,
+        )
+        return list(Recipe.objects.filter(pk__gt=last_id).order_by(
+            'pk'
+        ).values_list('pk', flat=True))
+
+    def create_recipe_relations(self, recipes, per_recipe):
+        """Тэги и ингредиенты рецептов."""
+        tags = list(Tag.objects.values_list('pk', flat=True))
+        ingredients = list(Ingredient.objects.values_list('pk', flat=True))
+        if not ingredients:
+            raise CommandError('Нет ингредиентов, загрузите load_ingredients.')
+        ingredient_weights = self.weights(len(ingredients))
+        tag_links = []
+        recipe_ingredients = []
+        for recipe_id in recipes:
+            for tag_id in self.random.sample(
+                tags, self.random.randint(1, min(3, len(tags)))
+            ):
+                tag_links.append(Recipe.tags.through(
+                    recipe_id=recipe_id, tag_id=tag_id
+                ))
+            for ingredient_id in self.sample(
+                ingredients, ingredient_weights, per_recipe
+            ):
+                recipe_ingredients.append(RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.random.randint(1, 500),
+                ))
+        Recipe.tags.through.objects.bulk_create(
+            tag_links, batch_size=self.batch_size
+        )
+        RecipeIngredient.objects.bulk_create(
+            recipe_ingredients, batch_size=self.batch_size
+        )
+        return len(recipe_ingredients)
+
+    def create_user_relations(self, users, recipes, options):
+        """Избранное, покупки и подписки с перекосом популярности."""
+        recipe_weights = self.weights(len(recipes))
+        author_weights = self.weights(len(users))
+        created = {}
+        for model, per_user in (
+            (FavoriteRecipes, options['favorites']),
+            (ShoppingCart, options['carts']),
+        ):
+            model.objects.bulk_create(
+                (
+                    model(user_id=user_id, recipe_id=recipe_id)
+                    for user_id in users
+                    for recipe_id in self.sample(
+                        recipes, recipe_weights, per_user
+                    )
+                ),
+                batch_size=self.batch_size,
+                ignore_conflicts=True,
+            )
+            created[model._meta.verbose_name_plural] = model.objects.filter(
+                user_id__in=users
+            ).count()
+        Subscriptions.objects.bulk_create(
+            (
+                Subscriptions(subscriber_id=subscriber_id, user_id=user_id)
+                for subscriber_id in users
+                for user_id in self.sample(
+                    users, author_weights, options['subscriptions']
+                )
+                if user_id != subscriber_id
+            ),
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+        created[Subscriptions._meta.verbose_name_plural] = (
+            Subscriptions.objects.filter(subscriber_id__in=users).count()
+        )
+        return created
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.skew = options['skew']
+        self.batch_size = options['batch_size']
+        started = time.perf_counter()
+        if options['clear']:
+            deleted, _ = User.objects.filter(
+                email__endswith=f'@{BENCHMARK_EMAIL_DOMAIN}'
+            ).delete()
+            self.stdout.write(f'Удалено объектов: {deleted}.')
+        if not Ingredient.objects.exists():
+            paths = [options['ingredients']] if options['ingredients'] else []
+            call_command('load_ingredients', *paths, stdout=self.stdout)
+        for name, slug in BENCHMARK_TAGS:
+            Tag.objects.get_or_create(slug=slug, defaults={'name': name})
+        with transaction.atomic():
+            users = self.create_users(options['users'])
+            recipes = self.create_recipes(options['recipes'], users)
+            ingredients = self.create_recipe_relations(
+                recipes, options['ingredients_per_recipe']
+            )
+            created = self.create_user_relations(users, recipes, options)
+        call_command('reconcile_counters', stdout=self.stdout)
+        call_command('rebuild_search_index', stdout=self.stdout)
+        call_command('rebuild_feeds', stdout=self.stdout)
+        tag_cache.bump()
+        ingredient_cache.bump()
+        recipe_response_cache.bump_feed()
+        summary = ', '.join(
+            f'{name}: {count}' for name, count in created.items()
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пользователей: {len(users)}, рецептов: {len(recipes)}, '
+            f'ингредиентов рецептов: {ingredients}, {summary} '
+            f'за {time.perf_counter() - started:.1f} с.'
+        ))
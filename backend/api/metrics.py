@@ -0,0 +1,210 @@
+"""Метрики запросов: количество SQL-запросов, время и размер ответов."""
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection
+from rest_framework import serializers
+
+METRIC_FIELDS = (
+    ('latency', 'seconds'),
+    ('queries', 'queries'),
+    ('db_time', 'seconds'),
+    ('serializer_time', 'seconds'),
+    ('response_size', 'bytes'),
+)
+QUANTILES = (0.5, 0.9, 0.99)
+
+local = threading.local()
+# Счетчики запроса видны и в потоках, куда asgiref и run_concurrently
+# копируют контекст, поэтому они изменяются под блокировкой.
+request_stats = ContextVar('request_stats', default=None)
+stats_lock = threading.Lock()
+
+
+def percentile(values, quantile):
+    """Перцентиль по ближайшему рангу отсортированных значений."""
+    if not values:
+        return None
+    index = min(len(values) - 1, int(quantile * len(values)))
+    return values[index]
+
+
+class Endpoint:
+    """Счетчики и последние значения метрик одного обработчика."""
+
+    def __init__(self, sample_size):
+        """Пустые выборки размером sample_size."""
+        self.count = 0
+        self.errors = 0
+        self.totals = {name: 0 for name, _ in METRIC_FIELDS}
+        self.samples = {
+            name: deque(maxlen=sample_size) for name, _ in METRIC_FIELDS
+        }
+
+    def add(self, values, error):
+        """Добавить замер запроса."""
+        self.count += 1
+        self.errors += error
+        for name, value in values.items():
+            self.totals[name] += value
+            self.samples[name].append(value)
+
+    def summary(self):
+        """Количество, суммы и перцентили."""
+        result = {'count': self.count, 'errors': self.errors}
+        for name, _ in METRIC_FIELDS:
+            values = sorted(self.samples[name])
+            result[name] = {
+                'total': self.totals[name],
+                **{
+                    f'p{int(quantile * 100)}': percentile(values, quantile)
+                    for quantile in QUANTILES
+                },
+            }
+        return result
+
+
+class MetricsRegistry:
+    """Метрики обработчиков в памяти процесса."""
+
+    def __init__(self, sample_size=None):
+        """Пустой реестр."""
+        self.sample_size = sample_size
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def add(self, endpoint, values, error=False):
+        """Добавить замер обработчика endpoint."""
+        with self.lock:
+            if endpoint not in self.endpoints:
+                self.endpoints[endpoint] = Endpoint(
+                    self.sample_size or settings.REQUEST_METRICS_SAMPLE_SIZE
+                )
+            self.endpoints[endpoint].add(values, error)
+
+    def reset(self):
+        """Очистить реестр."""
+        with self.lock:
+            self.endpoints = {}
+
+    def snapshot(self):
+        """Сводка по всем обработчикам."""
+        with self.lock:
+            return {
+                endpoint: stats.summary()
+                for endpoint, stats in sorted(self.endpoints.items())
+            }
+
+    def prometheus(self, extra=None):
+        """Сводка в текстовом формате Prometheus."""
+        lines = []
+        snapshot = self.snapshot()
+        counters = defaultdict(list)
+        for endpoint, summary in snapshot.items():
+            counters['requests'].append((endpoint, summary['count']))
+            counters['errors'].append((endpoint, summary['errors']))
+        for name, values in counters.items():
+            metric = f'foodgram_http_{name}_total'
+            lines.append(f'# TYPE {metric} counter')
+            lines.extend(
+                f'{metric}{{endpoint="{endpoint}"}} {value}'
+                for endpoint, value in values
+            )
+        for name, unit in METRIC_FIELDS:
+            metric = f'foodgram_http_{name}_{unit}'
+            lines.append(f'# TYPE {metric} summary')
+            for endpoint, summary in snapshot.items():
+                label = f'endpoint="{endpoint}"'
+                for quantile in QUANTILES:
+                    value = summary[name][f'p{int(quantile * 100)}']
+                    lines.append(
+                        f'{metric}{{{label},quantile="{quantile}"}} {value}'
+                    )
+                lines.append(
+                    f'{metric}_sum{{{label}}} {summary[name]["total"]}'
+                )
+                lines.append(f'{metric}_count{{{label}}} {summary["count"]}')
+        for metric, value in (extra or {}).items():
+            lines.append(f'# TYPE foodgram_{metric} counter')
+            lines.append(f'foodgram_{metric} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def add_stats(stats, **values):
+    """Увеличить счетчики запроса."""
+    with stats_lock:
+        for name, value in values.items():
+            stats[name] += value
+
+
+@contextmanager
+def collect():
+    """Счетчики текущего запроса."""
+    stats = {'queries': 0, 'db_time': 0, 'serializer_time': 0}
+    token = request_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        request_stats.reset(token)
+
+
+def count_queries(execute, sql, params, many, context):
+    """Обертка выполнения SQL, считающая запросы и время в базе."""
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats = request_stats.get()
+        if stats is not None:
+            add_stats(
+                stats, queries=1, db_time=time.perf_counter() - start
+            )
+
+
+@contextmanager
+def counting_queries():
+    """Счет запросов соединения потока пула, если идет замер запроса.
+
+    Обертка из RequestMetricsMiddleware стоит только на соединении
+    потока запроса, а у потоков пула соединения свои.
+    """
+    if request_stats.get() is None:
+        yield
+        return
+    with connection.execute_wrapper(count_queries):
+        yield
+
+
+def timed_data(fget):
+    """Свойство data, учитывающее время сериализации верхнего уровня."""
+    @wraps(fget)
+    def data(self):
+        stats = request_stats.get()
+        if stats is None or getattr(local, 'serializer_depth', 0):
+            return fget(self)
+        local.serializer_depth = 1
+        start = time.perf_counter()
+        try:
+            return fget(self)
+        finally:
+            add_stats(stats, serializer_time=time.perf_counter() - start)
+            local.serializer_depth = 0
+
+    data.timed = True
+    return data
+
+
+def instrument_serializers():
+    """Замер времени Serializer.data и ListSerializer.data."""
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        prop = cls.__dict__['data']
+        if not getattr(prop.fget, 'timed', False):
+            cls.data = property(timed_data(prop.fget))
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,51 @@
+"""Промежуточные слои."""
+import time
+
+from django.db import connection
+
+from .metrics import collect, count_queries, instrument_serializers, registry
+
+
+class RequestMetricsMiddleware:
+    """Замер запросов к базе, времени и размера ответа по обработчикам.
+
+    Подключается в settings.MIDDLEWARE только при REQUEST_METRICS=True,
+    поэтому в выключенном состоянии ничего не стоит.
+    """
+
+    def __init__(self, get_response):
+        """Включение замера времени сериализации."""
+        self.get_response = get_response
+        instrument_serializers()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Имя обработчика: ViewSet.action или имя функции."""
+        cls = getattr(view_func, 'cls', None)
+        if cls is None:
+            request.metrics_endpoint = getattr(
+                view_func, '__name__', repr(view_func)
+            )
+            return
+        actions = getattr(view_func, 'actions', None) or {}
+        action = actions.get(request.method.lower(), request.method.lower())
+        request.metrics_endpoint = f'{cls.__name__}.{action}'
+
+    def __call__(self, request):
+        """Замер запроса."""
+        start = time.perf_counter()
+        with collect() as stats, connection.execute_wrapper(count_queries):
+            response = self.get_response(request)
+        endpoint = getattr(request, 'metrics_endpoint', None)
+        if endpoint is None:
+            return response
+        size = 0 if response.streaming else len(response.content)
+        registry.add(
+            endpoint,
+            {
+                'latency': time.perf_counter() - start,
+                'response_size': size,
+                **stats,
+            },
+            error=response.status_code >= 500,
+        )
+        return response
@@ -1,12 +1,123 @@
 """Кастомный пагинатор."""
-from rest_framework.pagination import PageNumberPagination
+from collections import OrderedDict
 
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (BasePagination, CursorPagination,
+                                       LimitOffsetPagination)
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 
-class RecipesLimitPagination(PageNumberPagination):
-    """Пагинация рецептов."""
+from core.constants import RECIPES_MAX_PAGE_SIZE
+from core.functions import from_base62, to_base62
 
-    limit_query_param = 'recipes_limit'
+from .asynchronous import run_concurrently
+
+
+class RecipesCursorPagination(CursorPagination):
+    """Курсорная пагинация рецептов по убыванию id."""
+
+    ordering = '-id'
+    page_size_query_param = 'limit'
+    max_page_size = RECIPES_MAX_PAGE_SIZE
+
+
+class RecipesLimitPagination(LimitOffsetPagination):
+    """Пагинация рецептов.
+
+    По умолчанию limit/offset, при наличии параметра cursor (в том числе
+    пустого, для первой страницы) - курсорная, без COUNT(*) и OFFSET.
+    COUNT(*) и строки страницы читаются независимыми запросами.
+    """
+
+    cursor_pagination_class = RecipesCursorPagination
+
+    def __init__(self):
+        """Курсорный пагинатор создается при необходимости."""
+        self.cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Страница рецептов."""
+        paginator = self.cursor_pagination_class()
+        if paginator.cursor_query_param in request.query_params:
+            self.cursor_paginator = paginator
+            return paginator.paginate_queryset(queryset, request, view)
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+        self.request = request
+        self.count, page = run_concurrently(
+            lambda: self.get_count(queryset),
+            lambda: list(queryset[self.offset:self.offset + self.limit]),
+        )
+        if self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+        return page
+
+    def get_paginated_response(self, data):
+        """результат."""
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class FeedPagination(BasePagination):
+    """Keyset-пагинация ленты подписок по убыванию id рецепта.
+
+    Курсор - id последнего рецепта страницы в base62, поэтому страница
+    читается по индексу без OFFSET и COUNT(*).
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    max_page_size = RECIPES_MAX_PAGE_SIZE
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def __init__(self):
+        """Следующей страницы нет, пока не прочитана текущая."""
+        self.request = None
+        self.next_id = None
+
+    def get_page_size(self, request):
+        """Размер страницы из limit."""
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE
+        return max(1, min(size, self.max_page_size))
+
+    def get_before(self, request):
+        """id, после которого начинается страница, или None."""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            return from_base62(cursor)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_feed(self, feed, request):
+        """id рецептов страницы ленты пользователя."""
+        self.request = request
+        size = self.get_page_size(request)
+        ids = feed.page(request.user, self.get_before(request), size + 1)
+        self.next_id = ids[size - 1] if len(ids) > size else None
+        return ids[:size]
+
+    def get_next_link(self):
+        """Ссылка на следующую страницу."""
+        if self.next_id is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            to_base62(self.next_id),
+        )
 
     def get_paginated_response(self, data):
         """результат."""
-        return self.paginator.get_paginated_response(data)
+        return Response(OrderedDict((
+            ('next', self.get_next_link()),
+            ('results', data),
+        )))
@@ -0,0 +1,39 @@
+"""Парсеры запросов."""
+import codecs
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.utils import json
+
+from .renderers import FastJSONRenderer, orjson
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser на orjson.
+
+    То, что orjson не принимает (NaN, огромные целые), разбирается
+    стандартным json, как в JSONParser; кодировки, кроме UTF-8,
+    обрабатывает сам JSONParser.
+    """
+
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """Разбор тела запроса."""
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        data = stream.read()
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+        try:
+            parse_constant = json.strict_constant if self.strict else None
+            return json.loads(
+                data.decode(encoding), parse_constant=parse_constant
+            )
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
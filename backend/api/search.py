@@ -0,0 +1,375 @@
+"""Поиск ингредиентов по названию, рецептов по тексту и по продуктам."""
+import bisect
+import logging
+import re
+import threading
+import time
+from array import array
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+
+from core.constants import (INGREDIENT_INDEX_TTL, RECIPE_SEARCH_CONFIG,
+                            RECIPE_SEARCH_INDEX_TTL)
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            RecipeSearchDocument)
+
+from .cache import SharedCache
+
+logger = logging.getLogger(__name__)
+
+coverage_executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix='recipe-coverage'
+)
+
+UPDATE_VECTORS = (
+    'UPDATE recipes_recipesearchdocument AS document SET vector = '
+    "setweight(to_tsvector(%(config)s::regconfig, recipe.name), 'A') || "
+    'setweight(to_tsvector(%(config)s::regconfig, document.ingredients), '
+    "'B') || "
+    "setweight(to_tsvector(%(config)s::regconfig, recipe.text), 'C') "
+    'FROM recipes_recipe AS recipe '
+    'WHERE recipe.id = document.recipe_id'
+)
+WORD = re.compile(r'\w+')
+
+
+class IngredientNameIndex:
+    """Отсортированный индекс названий ингредиентов в памяти процесса.
+
+    Используется, когда в базе нет индексов для поиска по названию
+    (всё, кроме PostgreSQL).
+    """
+
+    def __init__(self, ttl=INGREDIENT_INDEX_TTL):
+        """Пустой индекс, строится при первом поиске."""
+        self.ttl = ttl
+        self.lock = Lock()
+        self.keys = []
+        self.items = []
+        self.built_at = None
+
+    def reset(self):
+        """Сбросить индекс после изменения ингредиентов."""
+        with self.lock:
+            self.built_at = None
+
+    def get(self):
+        """Ключи и записи индекса, при необходимости перестроенные."""
+        with self.lock:
+            if (self.built_at is None
+                    or time.monotonic() - self.built_at > self.ttl):
+                rows = sorted(
+                    Ingredient.objects.values(
+                        'id', 'name', 'measurement_unit'
+                    ),
+                    key=lambda row: (row['name'].lower(), row['id'])
+                )
+                self.keys = [row['name'].lower() for row in rows]
+                self.items = rows
+                self.built_at = time.monotonic()
+            return self.keys, self.items
+
+    def search(self, value, limit):
+        """Сначала совпадения по началу названия, затем по вхождению."""
+        keys, items = self.get()
+        value = value.lower()
+        result = []
+        position = bisect.bisect_left(keys, value)
+        while (position < len(keys) and len(result) < limit
+               and keys[position].startswith(value)):
+            result.append(items[position])
+            position += 1
+        for key, item in zip(keys, items):
+            if len(result) >= limit:
+                break
+            if value in key and not key.startswith(value):
+                result.append(item)
+        return result
+
+
+def tokenize(text):
+    """Слова текста в нижнем регистре, ё заменена на е."""
+    return WORD.findall(text.lower().replace('ё', 'е'))
+
+
+class RecipeSearchIndex:
+    """Инвертированный индекс рецептов в памяти процесса.
+
+    Используется вместо SearchVectorField, когда база не PostgreSQL.
+    Слово запроса совпадает со словами документа, которые с него
+    начинаются; рецепт должен содержать все слова запроса. Вес
+    совпадения: название 3, ингредиенты 2, описание 1. Изменения
+    рецептов этого процесса применяются сразу, других - после ttl.
+    """
+
+    weights = (('name', 3), ('ingredients', 2), ('text', 1))
+
+    def __init__(self, ttl=RECIPE_SEARCH_INDEX_TTL):
+        """Пустой индекс, строится при первом поиске."""
+        self.ttl = ttl
+        self.lock = Lock()
+        self.postings = {}
+        self.words = []
+        self.documents = {}
+        self.built_at = None
+
+    def reset(self):
+        """Сбросить индекс."""
+        with self.lock:
+            self.built_at = None
+
+    def add(self, pk, fields):
+        """Добавить или заменить документ рецепта; под self.lock."""
+        self.remove(pk)
+        scores = defaultdict(int)
+        for field, weight in self.weights:
+            for word in tokenize(fields[field]):
+                scores[word] += weight
+        for word, score in scores.items():
+            if word not in self.postings:
+                self.postings[word] = {}
+                bisect.insort(self.words, word)
+            self.postings[word][pk] = score
+        self.documents[pk] = tuple(scores)
+
+    def remove(self, pk):
+        """Убрать документ рецепта; под self.lock."""
+        for word in self.documents.pop(pk, ()):
+            self.postings[word].pop(pk, None)
+
+    def build(self):
+        """Индекс всех рецептов; под self.lock."""
+        self.postings = {}
+        self.words = []
+        self.documents = {}
+        for row in Recipe.objects.values(
+            'id', 'name', 'text', document=F('search_document__ingredients')
+        ).iterator():
+            row['ingredients'] = row.pop('document') or ''
+            self.add(row['id'], row)
+        self.built_at = time.monotonic()
+
+    def update(self, rows, removed):
+        """Обновить документы rows и убрать рецепты removed."""
+        with self.lock:
+            if self.built_at is None:
+                return
+            for pk in removed:
+                self.remove(pk)
+            for row in rows:
+                self.add(row['id'], row)
+
+    def search(self, query):
+        """{id рецепта: вес} всех рецептов со всеми словами query."""
+        terms = tokenize(query)
+        if not terms:
+            return {}
+        with self.lock:
+            if (self.built_at is None
+                    or time.monotonic() - self.built_at > self.ttl):
+                self.build()
+            result = None
+            for term in terms:
+                scores = defaultdict(int)
+                position = bisect.bisect_left(self.words, term)
+                while (position < len(self.words)
+                       and self.words[position].startswith(term)):
+                    for pk, score in self.postings[
+                        self.words[position]
+                    ].items():
+                        scores[pk] = max(scores[pk], score)
+                    position += 1
+                if result is None:
+                    result = scores
+                else:
+                    result = {
+                        pk: score + scores[pk]
+                        for pk, score in result.items() if pk in scores
+                    }
+                if not result:
+                    return {}
+        return result
+
+
+class IngredientCoverageIndex(SharedCache):
+    """Индекс ингредиент -> отсортированный массив id рецептов.
+
+    Для подбора рецептов по имеющимся продуктам: время запроса зависит
+    от суммы длин массивов запрошенных ингредиентов, то есть от размера
+    ответа, а не от числа рецептов. Версия индекса лежит в общем кэше
+    и меняется после коммита изменений рецептов в любом процессе. Запрос
+    только сверяет версию и читает готовый индекс, а устаревший индекс
+    пересобирается в фоновом потоке; пока индекса нет, покрытие
+    считается запросом к базе.
+    """
+
+    def __init__(self):
+        """Индекс еще не построен."""
+        super().__init__('SEARCH_CACHE_ALIAS', 'search:coverage')
+        self.lock = Lock()
+        self.building = False
+        self.index = None
+
+    def invalidate(self):
+        """Пересобрать индекс во всех процессах после коммита."""
+        self.bump()
+
+    def refresh(self):
+        """Построить индекс текущей версии одним проходом по базе."""
+        version = self.get_version()
+        postings = {}
+        sizes = defaultdict(int)
+        for ingredient_id, recipe_id in RecipeIngredient.objects.order_by(
+            'ingredient_id', 'recipe_id'
+        ).values_list('ingredient_id', 'recipe_id').iterator():
+            postings.setdefault(ingredient_id, array('l')).append(recipe_id)
+            sizes[recipe_id] += 1
+        self.index = (version, postings, dict(sizes))
+
+    def refresh_in_background(self):
+        """refresh() в потоке пула со своим соединением с базой."""
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception('Не удалось построить индекс продуктов')
+        finally:
+            self.building = False
+            connection.close()
+
+    def current(self):
+        """Построенный индекс или None; устаревший ставится в пересборку."""
+        index = self.index
+        if index is None or index[0] != self.get_version():
+            with self.lock:
+                if not self.building:
+                    self.building = True
+                    coverage_executor.submit(self.refresh_in_background)
+        return index
+
+    @staticmethod
+    def count_missing(have, allowed):
+        """Покрытие запросом к базе, пока индекс не построен."""
+        recipes = RecipeIngredient.objects.filter(
+            recipe_id__in=RecipeIngredient.objects.filter(
+                ingredient_id__in=have
+            ).values('recipe_id')
+        )
+        if allowed is not None:
+            recipes = recipes.filter(recipe_id__in=allowed)
+        return {
+            row['recipe_id']: row['total'] - row['matched']
+            for row in recipes.values('recipe_id').annotate(
+                total=Count('pk'),
+                matched=Count('pk', filter=Q(ingredient_id__in=have)),
+            ).order_by()
+        }
+
+    def search(self, have, allowed=None):
+        """{id рецепта: не хватает ингредиентов} с хотя бы одним из have.
+
+        allowed - id рецептов, прошедших остальные фильтры, None - все.
+        """
+        index = self.current()
+        if index is None:
+            return self.count_missing(have, allowed)
+        _, postings, sizes = index
+        matched = defaultdict(int)
+        for ingredient_id in set(have):
+            for pk in postings.get(ingredient_id, ()):
+                if allowed is None or pk in allowed:
+                    matched[pk] += 1
+        return {pk: sizes[pk] - count for pk, count in matched.items()}
+
+
+class RecipeSearch:
+    """Поисковые документы и индексы рецептов, обновление после коммита."""
+
+    def __init__(self):
+        """Индекс текста для баз, кроме PostgreSQL, и индекс продуктов."""
+        self.index = RecipeSearchIndex()
+        self.coverage = IngredientCoverageIndex()
+        self.local = threading.local()
+
+    def schedule(self, pk):
+        """Обновить документ рецепта после коммита.
+
+        Изменения одной транзакции объединяются в одно обновление.
+        """
+        batch = getattr(self.local, 'batch', None)
+        if batch is not None and any(
+            entry[1] is batch['flush'] for entry in connection.run_on_commit
+        ):
+            batch['ids'].add(pk)
+            return
+        ids = {pk}
+
+        def flush():
+            self.local.batch = None
+            self.update(ids)
+
+        self.local.batch = {'ids': ids, 'flush': flush}
+        transaction.on_commit(flush)
+
+    def documents(self, recipes):
+        """Строки рецептов с названиями ингредиентов через пробел."""
+        rows = list(recipes.values('id', 'name', 'text'))
+        names = defaultdict(list)
+        for recipe_id, name in RecipeIngredient.objects.filter(
+            recipe__in=recipes
+        ).order_by('recipe_id', 'ingredient__name').values_list(
+            'recipe_id', 'ingredient__name'
+        ):
+            names[recipe_id].append(name)
+        for row in rows:
+            row['ingredients'] = ' '.join(names[row['id']])
+        return rows
+
+    def update_vectors(self, ids=None):
+        """Пересчитать vector на PostgreSQL; ids=None - у всех."""
+        sql, params = UPDATE_VECTORS, {'config': RECIPE_SEARCH_CONFIG}
+        if ids is not None:
+            sql += ' AND document.recipe_id = ANY(%(ids)s)'
+            params['ids'] = list(ids)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def update(self, ids):
+        """Пересобрать документы и индексы рецептов ids."""
+        self.coverage.invalidate()
+        rows = self.documents(Recipe.objects.filter(pk__in=ids))
+        for row in rows:
+            RecipeSearchDocument.objects.update_or_create(
+                recipe_id=row['id'],
+                defaults={'ingredients': row['ingredients']},
+            )
+        if connection.vendor == 'postgresql':
+            if rows:
+                self.update_vectors([row['id'] for row in rows])
+            return
+        self.index.update(rows, set(ids) - {row['id'] for row in rows})
+
+    @transaction.atomic
+    def rebuild(self):
+        """Пересобрать документы всех рецептов."""
+        RecipeSearchDocument.objects.all().delete()
+        RecipeSearchDocument.objects.bulk_create(
+            (
+                RecipeSearchDocument(
+                    recipe_id=row['id'], ingredients=row['ingredients']
+                )
+                for row in self.documents(Recipe.objects.all())
+            ),
+            batch_size=1000,
+        )
+        if connection.vendor == 'postgresql':
+            self.update_vectors()
+        self.index.reset()
+        self.coverage.invalidate()
+
+
+ingredient_index = IngredientNameIndex()
+recipe_search = RecipeSearch()
@@ -1,25 +1,69 @@
 """Сериализаторы для работы с рецептами, ингредиентами и подписками."""
 from django.contrib.auth import get_user_model
-from django.contrib.auth.models import AnonymousUser
 from django.core.exceptions import ValidationError
-from drf_extra_fields.fields import Base64ImageField
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
 from rest_framework.exceptions import PermissionDenied
 
+from core.constants import AVATARS_DIR, RECIPE_IMAGES_DIR
+from core.images import is_raw_name
 from recipes.models import (FavoriteRecipes, Ingredient, Recipe,
                             RecipeIngredient, ShoppingCart, Tag)
 from users.models import Subscriptions
 
+from .cache import membership_cache
+from .feed import subscription_feed
+from .fields import ImageVariantsField, ProcessedImageField
+from .tasks import schedule_recipe_image
+
 User = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+class StoredImagesMixin:
+    """Сохранение изображений ProcessedImageField в create/update."""
+
+    def store_images(self, validated_data):
+        """Заменить загрузки в validated_data именами сохраненных файлов."""
+        for name, field in self.fields.items():
+            if (isinstance(field, ProcessedImageField)
+                    and validated_data.get(name)):
+                validated_data[name] = field.store(validated_data[name])
+        return validated_data
+
+    def create(self, validated_data):
+        """Создание с сохраненными изображениями."""
+        return super().create(self.store_images(validated_data))
+
+    def update(self, instance, validated_data):
+        """Изменение с сохраненными изображениями."""
+        return super().update(instance, self.store_images(validated_data))
+
+
+class MembershipMixin:
+    """Доступ к закэшированным множествам текущего пользователя."""
+
+    @property
+    def membership(self):
+        """Избранное, покупки и подписки пользователя из запроса."""
+        context = self.context
+        if 'membership' not in context:
+            context['membership'] = membership_cache.get(
+                context['request'].user
+            )
+        return context['membership']
+
+
+class UserSerializer(StoredImagesMixin, MembershipMixin,
+                     serializers.ModelSerializer):
     """Сериалайзер User."""
 
     is_subscribed = serializers.SerializerMethodField(
         read_only=True, required=False
     )
-    avatar = Base64ImageField(required=False, allow_null=True)
+    avatar = ProcessedImageField(
+        upload_to=AVATARS_DIR, required=False, allow_null=True
+    )
 
     class Meta:
         """Meta."""
@@ -37,12 +81,9 @@ class UserSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, user):
         """Получить is_subscribed."""
-        current_user = self.context.get('request').user
-        if isinstance(current_user, AnonymousUser):
-            return False
-        return Subscriptions.objects.filter(
-            user=user, subscriber=current_user
-        ).exists()
+        if hasattr(user, 'is_subscribed'):
+            return user.is_subscribed
+        return user.pk in self.membership.subscriptions
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -80,6 +121,8 @@ class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
 class RecipeSerializer(serializers.ModelSerializer):
     """Сериалайзер рецепта короткий."""
 
+    image_variants = ImageVariantsField(source='image')
+
     class Meta:
         """Meta."""
 
@@ -88,17 +131,24 @@ class RecipeSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time',
         )
 
 
-class RecipeCreateSerializer(serializers.ModelSerializer):
+class RecipeCreateSerializer(StoredImagesMixin,
+                             serializers.ModelSerializer):
     """Сериалайзер создания рецептов."""
 
     ingredients = RecipeIngredientCreateSerializer(many=True)
     tags = serializers.ListField(child=serializers.IntegerField())
     name = serializers.CharField(max_length=100)
-    image = Base64ImageField(required=True, allow_null=False)
+    image = ProcessedImageField(
+        upload_to=RECIPE_IMAGES_DIR,
+        background=True,
+        required=True,
+        allow_null=False,
+    )
     cooking_time = serializers.IntegerField(min_value=1)
 
     class Meta:
@@ -124,61 +174,83 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         """Валидация тэгов и ингредиентов."""
         ingredients_data = data.get('ingredients')
         tags_data = data.get('tags')
-        ingredients = []
-        tags = []
         if not ingredients_data:
             raise serializers.ValidationError('Добавьте ингредиенты.')
         if not tags_data:
             raise serializers.ValidationError('Добавьте тэги.')
+        ingredients = Ingredient.objects.in_bulk(
+            [ingredient['id'] for ingredient in ingredients_data]
+        )
+        ingredient_ids = set()
         for ingredient in ingredients_data:
-            try:
-                Ingredient.objects.get(pk=ingredient['id'])
-            except Ingredient.DoesNotExist:
+            if ingredient['id'] not in ingredients:
                 raise serializers.ValidationError(
                     'Такого ингредиента не существует.'
                 )
-            if ingredient in ingredients:
+            if ingredient['id'] in ingredient_ids:
                 raise serializers.ValidationError(
-                    f'{Ingredient.objects.get(pk=ingredient["id"])} уже есть.'
+                    f'{ingredients[ingredient["id"]]} уже есть.'
                 )
-            ingredients.append(ingredient)
+            ingredient_ids.add(ingredient['id'])
+        tags = Tag.objects.in_bulk(tags_data)
+        tag_ids = set()
         for tag_id in tags_data:
-            if tag_id in tags:
+            if tag_id not in tags:
+                raise serializers.ValidationError('Такого тэга не существует.')
+            if tag_id in tag_ids:
                 raise serializers.ValidationError(
-                    f'Тэг {Tag.objects.get(pk=tag_id)} добавлен повторно.'
+                    f'Тэг {tags[tag_id]} добавлен повторно.'
                 )
-            try:
-                Tag.objects.get(pk=tag_id)
-            except Tag.DoesNotExist:
-                raise serializers.ValidationError('Такого тэга не существует.')
-            tags.append(tag_id)
+            tag_ids.add(tag_id)
         return data
 
+    @staticmethod
+    def get_image_status(image):
+        """Состояние изображения сразу после загрузки."""
+        if is_raw_name(str(image)):
+            return Recipe.ImageStatus.PENDING
+        return Recipe.ImageStatus.READY
+
+    @staticmethod
+    def create_ingredients(recipe, ingredients_data):
+        """Добавление ингредиентов в рецепт одним запросом."""
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                ingredient_id=ingredient['id'],
+                recipe=recipe,
+                amount=ingredient['amount'],
+            )
+            for ingredient in ingredients_data
+        )
+
+    @transaction.atomic
     def create(self, validated_data):
         """Создание рецепта."""
+        self.store_images(validated_data)
         ingredients_data = validated_data.pop('ingredients')
         tags_data = validated_data.pop('tags')
         validated_data['author'] = self.context['request'].user
+        validated_data['image_status'] = self.get_image_status(
+            validated_data['image']
+        )
         recipe = Recipe.objects.create(**validated_data)
-
-        for ingredient in ingredients_data:
-
-            RecipeIngredient.objects.create(
-                ingredient=Ingredient.objects.get(pk=ingredient['id']),
-                recipe=recipe,
-                amount=ingredient['amount'],
-            )
-        for tag_id in tags_data:
-            recipe.tags.add(Tag.objects.get(pk=tag_id))
+        self.create_ingredients(recipe, ingredients_data)
+        recipe.tags.set(tags_data)
+        schedule_recipe_image(recipe)
+        subscription_feed.publish(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Изменение рецепта."""
         current_user = self.context.get('request').user
         if instance.author != current_user:
             raise PermissionDenied('У вас нет прав для изменений.')
+        self.store_images(validated_data)
         instance.name = validated_data.get('name', instance.name)
-        instance.image = validated_data.get('image', instance.image)
+        if 'image' in validated_data:
+            instance.image = validated_data['image']
+            instance.image_status = self.get_image_status(instance.image)
         instance.cooking_time = validated_data.get(
             'cooking_time', instance.cooking_time
         )
@@ -186,14 +258,10 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         RecipeIngredient.objects.filter(recipe=instance).delete()
         ingredients_data = validated_data.pop('ingredients')
         tags_data = validated_data.pop('tags')
-        for ingredient in ingredients_data:
-            RecipeIngredient.objects.create(
-                ingredient=Ingredient.objects.get(pk=ingredient['id']),
-                recipe=instance,
-                amount=ingredient['amount'],
-            )
+        self.create_ingredients(instance, ingredients_data)
         instance.tags.set(tags_data)
         instance.save()
+        schedule_recipe_image(instance)
         return instance
 
     def to_representation(self, instance):
@@ -204,7 +272,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         return serializer.data
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(MembershipMixin, serializers.ModelSerializer):
     """Сериалайзер получения рецептов."""
 
     author = UserSerializer(read_only=True)
@@ -214,6 +282,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     is_in_shopping_cart = serializers.SerializerMethodField(
         read_only=True, required=False
     )
+    image_variants = ImageVariantsField(source='image')
 
     class Meta:
         """Meta."""
@@ -228,13 +297,19 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
+            'image_status',
             'text',
             'cooking_time',
         )
 
     def get_ingredients(self, obj):
         """Получение ингредиентов."""
-        recipe_ingredients = obj.ingredients.select_related('ingredient')
+        prefetch_related_objects([obj], Prefetch(
+            'ingredients',
+            queryset=RecipeIngredient.objects.select_related('ingredient')
+        ))
+        recipe_ingredients = obj.ingredients.all()
         return [
             {
                 "id": recipe_ingredient.ingredient.id,
@@ -248,37 +323,19 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 
     def get_is_favorited(self, obj):
         """Добавлено ли в избранное."""
-        current_user = self.context.get('request').user
-        if isinstance(current_user, AnonymousUser):
-            return False
-        return FavoriteRecipes.objects.filter(
-            user=current_user, recipe=obj
-        ).exists()
+        return obj.pk in self.membership.favorites
 
     def get_is_in_shopping_cart(self, obj):
         """Добавлено ли в список."""
-        current_user = self.context.get('request').user
-        if isinstance(current_user, AnonymousUser):
-            return False
-        return ShoppingCart.objects.filter(
-            user=current_user, recipe=obj
-        ).exists()
+        return obj.pk in self.membership.cart
 
 
-class RecipeShopSerializer(RecipeReadSerializer):
+class AvatarSerializer(StoredImagesMixin, serializers.ModelSerializer):
     """Сериалайзер Avatar."""
 
-    class Meta:
-        """Meta."""
-
-        model = Recipe
-        fields = ('name', 'ingredients')
-
-
-class AvatarSerializer(serializers.ModelSerializer):
-    """Сериалайзер Avatar."""
-
-    avatar = Base64ImageField(required=False, allow_null=True)
+    avatar = ProcessedImageField(
+        upload_to=AVATARS_DIR, required=False, allow_null=True
+    )
 
     class Meta:
         """Meta."""
@@ -339,13 +396,15 @@ class SubscriptionSerializer(UserSerializer):
         """Рецепты с лимитом."""
         limit = self.context.get('recipes_limit')
         recipes = obj.recipes.all()
-        if limit:
-            recipes = obj.recipes.all()[:int(limit)]
+        if limit and limit.isdigit():
+            recipes = recipes[:int(limit)]
         serializer = RecipeSerializer(recipes, many=True)
         return serializer.data
 
     def get_recipes_count(self, obj):
         """Количество рецептов."""
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
 
@@ -0,0 +1,51 @@
+"""Короткие ссылки на рецепты."""
+from collections import OrderedDict
+from threading import Lock
+
+from core.constants import SHORT_LINK_CACHE_SIZE
+from core.functions import from_base62
+from recipes.models import Recipe
+
+
+class ShortLinkResolver:
+    """Код короткой ссылки -> id рецепта с LRU-кэшем в памяти процесса.
+
+    Код - это id рецепта в base62, поэтому таблица не нужна; в базе
+    проверяется только существование рецепта по первичному ключу.
+    Кэшируются лишь найденные рецепты, чтобы код будущего рецепта
+    не застрял в кэше как несуществующий.
+    """
+
+    def __init__(self, maxsize=SHORT_LINK_CACHE_SIZE):
+        """Пустой кэш на maxsize кодов."""
+        self.maxsize = maxsize
+        self.lock = Lock()
+        self.items = OrderedDict()
+
+    def resolve(self, code):
+        """Id рецепта по коду или None."""
+        with self.lock:
+            if code in self.items:
+                self.items.move_to_end(code)
+                return self.items[code]
+        try:
+            pk = from_base62(code)
+        except ValueError:
+            return None
+        if not Recipe.objects.filter(pk=pk).exists():
+            return None
+        with self.lock:
+            self.items[code] = pk
+            if len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+        return pk
+
+    def discard(self, pk):
+        """Убрать удаленный рецепт из кэша."""
+        with self.lock:
+            for code in [code for code, value in self.items.items()
+                         if value == pk]:
+                del self.items[code]
+
+
+short_link_resolver = ShortLinkResolver()
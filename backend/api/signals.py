@@ -0,0 +1,178 @@
+"""Обработчики сигналов моделей."""
+from django.contrib.auth import get_user_model
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from recipes.models import (FavoriteRecipes, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from users.models import Subscriptions
+
+from .cache import (ingredient_cache, membership_cache, recipe_response_cache,
+                    tag_cache)
+from .connections import check_connections, connection_stats
+from .feed import subscription_feed
+from .search import ingredient_index, recipe_search
+from .shortlinks import short_link_resolver
+
+User = get_user_model()
+
+
+@receiver(connection_created)
+def count_db_connection(**kwargs):
+    """Счетчик новых соединений с базой."""
+    connection_stats.add('connections_opened')
+
+
+@receiver(request_started)
+def check_db_connections(**kwargs):
+    """Проверка постоянных соединений перед запросом."""
+    check_connections()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def reset_ingredient_index(**kwargs):
+    """Сброс индекса поиска ингредиентов."""
+    ingredient_index.reset()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_ingredient_cache(**kwargs):
+    """Новая версия кэша ингредиентов."""
+    ingredient_cache.bump()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tag_cache(**kwargs):
+    """Новая версия кэша тэгов."""
+    tag_cache.bump()
+
+
+@receiver(post_save, sender=FavoriteRecipes)
+@receiver(post_save, sender=ShoppingCart)
+def increment_recipe_counter(sender, instance, created, **kwargs):
+    """Увеличение счетчика рецепта при добавлении в избранное/покупки."""
+    if created:
+        Recipe.objects.filter(pk=instance.recipe_id).update(
+            **{sender.counter_field: F(sender.counter_field) + 1}
+        )
+
+
+@receiver(post_delete, sender=FavoriteRecipes)
+@receiver(post_delete, sender=ShoppingCart)
+def decrement_recipe_counter(sender, instance, **kwargs):
+    """Уменьшение счетчика рецепта при удалении из избранного/покупок."""
+    Recipe.objects.filter(
+        pk=instance.recipe_id, **{f'{sender.counter_field}__gt': 0}
+    ).update(**{sender.counter_field: F(sender.counter_field) - 1})
+
+
+@receiver((post_save, post_delete), sender=FavoriteRecipes)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def bump_user_membership(instance, **kwargs):
+    """Новая версия кэша избранного и покупок пользователя."""
+    membership_cache.bump(instance.user_id)
+
+
+@receiver((post_save, post_delete), sender=Subscriptions)
+def bump_subscriber_membership(instance, **kwargs):
+    """Новая версия кэша подписок пользователя."""
+    membership_cache.bump(instance.subscriber_id)
+
+
+@receiver(post_save, sender=Subscriptions)
+def fill_subscriber_feed(instance, created, **kwargs):
+    """Последние рецепты нового автора в ленте подписчика."""
+    if created:
+        subscription_feed.follow(instance.subscriber_id, instance.user_id)
+
+
+@receiver(post_delete, sender=Subscriptions)
+def clear_subscriber_feed(instance, **kwargs):
+    """Рецепты автора больше не в ленте бывшего подписчика."""
+    subscription_feed.unfollow(instance.subscriber_id, instance.user_id)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe_response(instance, **kwargs):
+    """Сброс закэшированной страницы рецепта и ленты."""
+    recipe_response_cache.invalidate([instance.pk])
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def invalidate_recipe_ingredient_response(instance, **kwargs):
+    """Сброс страницы рецепта при изменении его ингредиентов."""
+    recipe_response_cache.invalidate([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags_response(instance, action, reverse, pk_set,
+                                    **kwargs):
+    """Сброс страниц рецептов при изменении их тэгов."""
+    if not reverse:
+        if action.startswith('post_'):
+            recipe_response_cache.invalidate([instance.pk])
+    elif action == 'pre_clear':
+        recipe_response_cache.invalidate(
+            Recipe.objects.filter(tags=instance).values_list('pk', flat=True)
+        )
+    elif action in ('post_add', 'post_remove'):
+        recipe_response_cache.invalidate(pk_set)
+
+
+@receiver((post_save, pre_delete), sender=Tag)
+def invalidate_tag_responses(instance, **kwargs):
+    """Сброс страниц рецептов с измененным тэгом."""
+    recipe_response_cache.invalidate(
+        Recipe.objects.filter(tags=instance).values_list('pk', flat=True)
+    )
+
+
+@receiver((post_save, pre_delete), sender=Ingredient)
+def invalidate_ingredient_responses(instance, **kwargs):
+    """Сброс страниц рецептов с измененным ингредиентом."""
+    recipe_response_cache.invalidate(
+        Recipe.objects.filter(
+            ingredients__ingredient=instance
+        ).values_list('pk', flat=True)
+    )
+
+
+@receiver((post_save, pre_delete), sender=User)
+def invalidate_author_responses(instance, created=False, update_fields=None,
+                                **kwargs):
+    """Сброс страниц рецептов автора при изменении профиля."""
+    if created or update_fields == frozenset(('last_login',)):
+        return
+    recipe_response_cache.invalidate(
+        instance.recipes.values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def discard_short_link(instance, **kwargs):
+    """Удаление рецепта из кэша коротких ссылок."""
+    short_link_resolver.discard(instance.pk)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def update_recipe_search(sender, instance, **kwargs):
+    """Обновление поискового документа рецепта после коммита."""
+    recipe_search.schedule(
+        instance.pk if sender is Recipe else instance.recipe_id
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_recipes_search(instance, created, **kwargs):
+    """Обновление документов рецептов с переименованным ингредиентом."""
+    if created:
+        return
+    for recipe_id in RecipeIngredient.objects.filter(
+        ingredient=instance
+    ).values_list('recipe_id', flat=True):
+        recipe_search.schedule(recipe_id)
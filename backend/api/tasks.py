@@ -0,0 +1,59 @@
+"""Фоновая обработка изображений рецептов."""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+
+from core.images import is_raw_name, process_upload
+from recipes.models import Recipe
+
+from .cache import recipe_response_cache
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_PROCESSING_WORKERS,
+    thread_name_prefix='recipe-images',
+)
+
+
+def process_recipe_image(recipe_id, raw_name):
+    """Обработка исходного изображения рецепта."""
+    try:
+        name = process_upload(raw_name)
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', raw_name)
+        Recipe.objects.filter(pk=recipe_id, image=raw_name).update(
+            image_status=Recipe.ImageStatus.FAILED
+        )
+        recipe_response_cache.invalidate([recipe_id])
+        return
+    Recipe.objects.filter(pk=recipe_id, image=raw_name).update(
+        image=name, image_status=Recipe.ImageStatus.READY
+    )
+    recipe_response_cache.invalidate([recipe_id])
+    if not Recipe.objects.filter(image=raw_name).exists():
+        default_storage.delete(raw_name)
+
+
+def run_in_background(recipe_id, raw_name):
+    """Запуск обработки в потоке пула со своим соединением с базой."""
+    try:
+        process_recipe_image(recipe_id, raw_name)
+    finally:
+        connection.close()
+
+
+def schedule_recipe_image(recipe):
+    """Поставить изображение рецепта в обработку, если нужно."""
+    if not is_raw_name(recipe.image.name):
+        return
+    if settings.IMAGE_PROCESSING_SYNC:
+        process_recipe_image(recipe.pk, recipe.image.name)
+        recipe.refresh_from_db(fields=('image', 'image_status'))
+        return
+    transaction.on_commit(lambda: executor.submit(
+        run_in_background, recipe.pk, recipe.image.name
+    ))
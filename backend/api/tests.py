@@ -0,0 +1,559 @@
+"""Тесты API."""
+import base64
+import datetime
+import decimal
+import io
+import shutil
+import tempfile
+import uuid
+from pathlib import Path
+from unittest import skipUnless
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api.asynchronous import database_sync_to_async, run_concurrently
+from api.cache import ingredient_cache, tag_cache
+from api.feed import subscription_feed
+from api.management.commands import run_benchmark
+from api.metrics import collect
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer, orjson
+from api.search import recipe_search
+from recipes.models import (FavoriteRecipes, FeedEntry, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from users.models import Subscriptions
+
+User = get_user_model()
+
+
+def clear_caches():
+    """Пустые кэши, чтобы число запросов не зависело от порядка тестов."""
+    for cache in caches.all():
+        cache.clear()
+    tag_cache.local = None
+    ingredient_cache.local = None
+
+
+def image_data(color='red'):
+    """PNG 8x8 в формате data URI."""
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), color).save(buffer, 'PNG')
+    return (
+        'data:image/png;base64,'
+        + base64.b64encode(buffer.getvalue()).decode()
+    )
+
+
+class TemporaryMediaMixin:
+    """MEDIA_ROOT во временном каталоге на время теста."""
+
+    def setUp(self):
+        """Пустой каталог медиа."""
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+
+    def media_files(self):
+        """Все файлы в каталоге медиа."""
+        return [
+            path for path in Path(self.media_root).rglob('*')
+            if path.is_file()
+        ]
+
+
+class RecipeDataMixin:
+    """Авторы, тэги, ингредиенты и рецепты со связями."""
+
+    recipes_count = 110
+
+    @classmethod
+    def setUpTestData(cls):
+        """Данные один раз на класс."""
+        cls.authors = [
+            User.objects.create(
+                email=f'author{number}@example.com',
+                username=f'author{number}',
+                first_name='Имя',
+                last_name='Фамилия',
+            )
+            for number in range(3)
+        ]
+        cls.user = User.objects.create(
+            email='user@example.com',
+            username='user',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+        cls.tags = [
+            Tag.objects.create(name=f'Тэг {number}', slug=f'tag{number}')
+            for number in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(30)
+        ]
+        cls.recipes = []
+        for number in range(cls.recipes_count):
+            recipe = Recipe.objects.create(
+                author=cls.authors[number % len(cls.authors)],
+                name=f'Рецепт {number}',
+                text='Описание',
+                cooking_time=number % 60 + 1,
+                image='api/images/recipe.png',
+            )
+            recipe.tags.set(cls.tags[:number % len(cls.tags) + 1])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=cls.ingredients[
+                        (number + shift) % len(cls.ingredients)
+                    ],
+                    amount=shift + 1,
+                )
+                for shift in range(5)
+            )
+            cls.recipes.append(recipe)
+        for recipe in cls.recipes[::4]:
+            FavoriteRecipes.objects.create(user=cls.user, recipe=recipe)
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        Subscriptions.objects.create(user=cls.authors[0], subscriber=cls.user)
+
+    def setUp(self):
+        """Аноним и пользователь с пустыми кэшами."""
+        clear_caches()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class RecipeListQueriesTest(RecipeDataMixin, TestCase):
+    """Число запросов ленты рецептов не зависит от размера страницы."""
+
+    def assert_constant_queries(self, client, expected):
+        """Одинаковое число запросов для limit=6 и limit=100."""
+        for limit in (6, 100):
+            with self.subTest(limit=limit):
+                clear_caches()
+                with self.assertNumQueries(expected):
+                    response = client.get('/api/recipes/', {'limit': limit})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()['results']), limit)
+
+    def test_anonymous(self):
+        """Лента анонима."""
+        self.assert_constant_queries(self.anonymous, 4)
+
+    def test_authenticated(self):
+        """Лента пользователя с избранным, покупками и подписками."""
+        self.assert_constant_queries(self.client, 7)
+
+
+@override_settings(IMAGE_PROCESSING_SYNC=True)
+class RecipeImageTest(TemporaryMediaMixin, RecipeDataMixin, TestCase):
+    """Изображения сохраняются только для прошедших валидацию запросов."""
+
+    recipes_count = 1
+
+    def recipe_data(self, **fields):
+        """Тело запроса создания рецепта."""
+        data = {
+            'ingredients': [
+                {'id': self.ingredients[0].pk, 'amount': 10},
+            ],
+            'tags': [self.tags[0].pk],
+            'image': image_data(),
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+        }
+        data.update(fields)
+        return data
+
+    def test_invalid_request_leaves_no_files(self):
+        """Ошибка валидации после поля image."""
+        for fields in (
+            {'tags': []},
+            {'ingredients': [
+                {'id': self.ingredients[0].pk, 'amount': 1},
+                {'id': self.ingredients[0].pk, 'amount': 2},
+            ]},
+        ):
+            with self.subTest(fields=fields):
+                response = self.client.post(
+                    '/api/recipes/', self.recipe_data(**fields), format='json'
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(self.media_files(), [])
+
+    def test_valid_request_saves_image_and_variants(self):
+        """Успешное создание сохраняет изображение и варианты."""
+        response = self.client.post(
+            '/api/recipes/', self.recipe_data(), format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        recipe = Recipe.objects.get(pk=response.json()['id'])
+        self.assertEqual(recipe.image_status, Recipe.ImageStatus.READY)
+        self.assertEqual(
+            response.json()['image_status'], Recipe.ImageStatus.READY
+        )
+        self.assertTrue(response.json()['image'].endswith(recipe.image.url))
+        self.assertIn(
+            Path(self.media_root, recipe.image.name), self.media_files()
+        )
+        self.assertEqual(len(self.media_files()), 5)
+
+
+class RecipeRepresentationTest(RecipeDataMixin, TestCase):
+    """RecipeRepresentation дает тот же JSON, что RecipeReadSerializer."""
+
+    recipes_count = 12
+
+    def render(self, client, path, fast):
+        """Тело ответа с представлением или сериализатором."""
+        clear_caches()
+        with override_settings(FAST_RECIPE_REPRESENTATION=fast):
+            response = client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def test_same_json(self):
+        """Лента и рецепт для анонима и пользователя."""
+        for client in (self.anonymous, self.client):
+            for path in (
+                '/api/recipes/?limit=20',
+                f'/api/recipes/{self.recipes[0].pk}/',
+                f'/api/recipes/{self.recipes[1].pk}/',
+            ):
+                with self.subTest(
+                    path=path, authenticated=client is self.client
+                ):
+                    self.assertEqual(
+                        self.render(client, path, fast=True),
+                        self.render(client, path, fast=False),
+                    )
+
+
+class RecipeWriteQueriesTest(RecipeDataMixin, TestCase):
+    """Число запросов создания и изменения не зависит от ингредиентов."""
+
+    recipes_count = 1
+
+    def recipe_data(self, ingredients_count):
+        """Тело запроса с ingredients_count ингредиентами и двумя тэгами."""
+        return {
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': number + 1}
+                for number, ingredient in enumerate(
+                    self.ingredients[:ingredients_count]
+                )
+            ],
+            'tags': [tag.pk for tag in self.tags[:2]],
+            'image': image_data(),
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+        }
+
+    def assert_constant_queries(self, method, expected):
+        """Одинаковое число запросов для 2 и 20 ингредиентов.
+
+        Изменяется каждый раз новый рецепт с одним тэгом и пятью
+        ингредиентами, чтобы запросы не зависели от прошлого изменения.
+        """
+        for ingredients_count in (2, 20):
+            with self.subTest(ingredients=ingredients_count):
+                url = '/api/recipes/'
+                if method == 'patch':
+                    recipe = Recipe.objects.create(
+                        author=self.user,
+                        name='Рецепт',
+                        text='Описание',
+                        cooking_time=5,
+                        image='api/images/recipe.png',
+                    )
+                    recipe.tags.set(self.tags[:1])
+                    RecipeIngredient.objects.bulk_create(
+                        RecipeIngredient(
+                            recipe=recipe, ingredient=ingredient, amount=1
+                        )
+                        for ingredient in self.ingredients[-5:]
+                    )
+                    url = f'{url}{recipe.pk}/'
+                clear_caches()
+                with self.assertNumQueries(expected):
+                    response = getattr(self.client, method)(
+                        url, self.recipe_data(ingredients_count),
+                        format='json',
+                    )
+                self.assertLess(response.status_code, 300)
+                self.assertEqual(
+                    len(response.json()['ingredients']), ingredients_count
+                )
+
+    def test_create(self):
+        """POST /api/recipes/."""
+        self.assert_constant_queries('post', 14)
+
+    def test_update(self):
+        """PATCH /api/recipes/<id>/."""
+        self.assert_constant_queries('patch', 19)
+
+
+@skipUnless(orjson, 'orjson не установлен.')
+class FastJSONTest(RecipeDataMixin, TestCase):
+    """FastJSONRenderer и FastJSONParser совпадают со стандартными."""
+
+    recipes_count = 10
+
+    def assert_same_json(self, data, renderer_context=None):
+        """Одинаковые байты рендереров и одинаковый разбор."""
+        expected = JSONRenderer().render(
+            data, 'application/json', renderer_context
+        )
+        self.assertEqual(
+            FastJSONRenderer().render(
+                data, 'application/json', renderer_context
+            ),
+            expected,
+        )
+        self.assertEqual(
+            FastJSONParser().parse(io.BytesIO(expected)),
+            JSONParser().parse(io.BytesIO(expected)),
+        )
+
+    def test_endpoints(self):
+        """Ответы всех сценариев run_benchmark."""
+        command = run_benchmark.Command()
+        command.anon, command.auth = self.anonymous, self.client
+        for name, (client, method, path, params) in command.get_scenarios(
+            self.user
+        ).items():
+            for request_method in method.split('+'):
+                response = getattr(client, request_method)(
+                    path, params if request_method == 'get' else None
+                )
+                if getattr(response, 'data', None) is None:
+                    continue
+                with self.subTest(scenario=name, method=request_method):
+                    self.assert_same_json(
+                        response.data, response.renderer_context
+                    )
+
+    def test_special_values(self):
+        """Типы и значения, которые orjson кодирует иначе или не знает.
+
+        Каждое значение проверяется отдельно: большое целое переключает
+        на стандартный json весь ответ.
+        """
+        for value in (
+            decimal.Decimal('1.50'),
+            datetime.datetime(
+                2024, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc
+            ),
+            datetime.date(2024, 1, 2),
+            uuid.UUID(int=1),
+            2 ** 70,
+            'a\u2028b\u2029c',
+            'Рецепт "пирог" </script>',
+            {1: 'нестроковый ключ'},
+            [{'float': 0.1, 'none': None, 'bool': True}],
+        ):
+            with self.subTest(value=value):
+                self.assert_same_json({'value': value})
+
+
+class SubscriptionFeedTest(RecipeDataMixin, TestCase):
+    """Лента подписок при переходе автора через порог подписчиков."""
+
+    recipes_count = 3
+
+    def feed_ids(self, user):
+        """id рецептов ленты пользователя."""
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/recipes/feed/')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    @patch('api.feed.FEED_READ_AUTHORS_TTL', 0)
+    @patch('api.feed.FEED_FANOUT_MAX_SUBSCRIBERS', 2)
+    def test_author_below_threshold_is_backfilled(self):
+        """Рецепт, опубликованный выше порога, остается в ленте."""
+        author, subscriber, other = self.authors
+        for user in (subscriber, other):
+            Subscriptions.objects.create(user=author, subscriber=user)
+        self.assertIn(author.pk, subscription_feed.read_authors())
+        recipe = Recipe.objects.create(
+            author=author,
+            name='Новый рецепт',
+            text='Описание',
+            cooking_time=5,
+            image='api/images/recipe.png',
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            subscription_feed.publish(recipe)
+        self.assertFalse(FeedEntry.objects.filter(recipe=recipe).exists())
+        self.assertIn(recipe.pk, self.feed_ids(subscriber))
+        Subscriptions.objects.get(user=author, subscriber=other).delete()
+        self.assertIn(recipe.pk, self.feed_ids(subscriber))
+        self.assertTrue(FeedEntry.objects.filter(
+            user=subscriber, recipe=recipe
+        ).exists())
+
+
+class RecipeFilterTest(RecipeDataMixin, TestCase):
+    """Поиск и подбор по продуктам вместе с остальными фильтрами."""
+
+    recipes_count = 12
+
+    @classmethod
+    def setUpTestData(cls):
+        """Поисковые документы рецептов."""
+        super().setUpTestData()
+        recipe_search.rebuild()
+
+    def get(self, **params):
+        """Число найденных рецептов и id на странице."""
+        response = self.client.get('/api/recipes/', params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return data['count'], [recipe['id'] for recipe in data['results']]
+
+    def test_search(self):
+        """Счетчик и страницы считаются после фильтра по автору."""
+        author = self.authors[0]
+        expected = sorted(
+            (recipe.pk for recipe in self.recipes if recipe.author == author),
+            reverse=True,
+        )
+        self.assertEqual(
+            self.get(search='описание', author=author.pk, limit=2),
+            (len(expected), expected[:2]),
+        )
+
+    def test_have(self):
+        """Покрытие считается по рецептам, прошедшим фильтр по автору.
+
+        Одинаково запросом к базе, пока индекса нет, и по индексу.
+        """
+        coverage = recipe_search.coverage
+        have = ','.join(
+            str(ingredient.pk) for ingredient in self.ingredients[:5]
+        )
+        for built in (False, True):
+            coverage.index = None
+            if built:
+                coverage.refresh()
+            with self.subTest(built=built), patch(
+                'api.search.coverage_executor'
+            ) as executor:
+                self.assertEqual(
+                    self.get(have=have, limit=3),
+                    (5, [recipe.pk for recipe in self.recipes[:3]]),
+                )
+                self.assertEqual(
+                    self.get(have=have, author=self.authors[1].pk),
+                    (2, [self.recipes[1].pk, self.recipes[4].pk]),
+                )
+                self.assertEqual(executor.submit.called, not built)
+            coverage.building = False
+
+    def test_have_index_invalidation(self):
+        """Новая версия в общем кэше ставит индекс в пересборку."""
+        coverage = recipe_search.coverage
+        coverage.refresh()
+        index = coverage.index
+        with patch('api.search.coverage_executor') as executor:
+            self.assertIs(coverage.current(), index)
+            executor.submit.assert_not_called()
+            with self.captureOnCommitCallbacks(execute=True):
+                coverage.invalidate()
+            self.assertIs(coverage.current(), index)
+            executor.submit.assert_called_once_with(
+                coverage.refresh_in_background
+            )
+        coverage.building = False
+
+
+@override_settings(ALLOWED_HOSTS=['testserver', 'example.com'])
+class RecipeResponseCacheTest(RecipeDataMixin, TestCase):
+    """Кэш страниц рецептов для анонима."""
+
+    recipes_count = 3
+
+    def get(self, path, host='testserver'):
+        """Ответ анониму и признак попадания в кэш."""
+        response = self.anonymous.get(path, HTTP_HOST=host)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), response['X-Cache']
+
+    def test_detail(self):
+        """Один ключ для записей id, свой для хоста, сброс по id."""
+        recipe = self.recipes[0]
+        data, cache = self.get(f'/api/recipes/0{recipe.pk}/')
+        self.assertEqual(cache, 'MISS')
+        self.assertEqual(
+            self.get(f'/api/recipes/{recipe.pk}/'), (data, 'HIT')
+        )
+        other, cache = self.get(f'/api/recipes/{recipe.pk}/', 'example.com')
+        self.assertEqual(cache, 'MISS')
+        self.assertIn('//example.com/', other['image'])
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.name = 'Новое название'
+            recipe.save()
+        for host in ('testserver', 'example.com'):
+            data, cache = self.get(f'/api/recipes/{recipe.pk}/', host)
+            self.assertEqual(cache, 'MISS')
+            self.assertEqual(data['name'], 'Новое название')
+        response = self.anonymous.get('/api/recipes/abc/')
+        self.assertEqual(response.status_code, 404)
+
+
+class PoolThreadMetricsTest(TestCase):
+    """Запросы потоков пула входят в метрики запроса."""
+
+    @staticmethod
+    def closing(query):
+        """query() с закрытием соединения потока пула.
+
+        Иначе постоянное соединение потока помешает удалить тестовую базу.
+        """
+        def run():
+            try:
+                return query()
+            finally:
+                connection.close()
+        return run
+
+    def test_database_sync_to_async(self):
+        """Запрос представления, выполненного в пуле потоков."""
+        with collect() as stats:
+            async_to_sync(database_sync_to_async(
+                self.closing(lambda: list(Tag.objects.all()))
+            ))()
+        self.assertEqual(stats['queries'], 1)
+
+    @override_settings(ASYNC_VIEWS=True)
+    def test_run_concurrently(self):
+        """Независимые запросы в отдельном пуле потоков."""
+        with collect() as stats, patch.dict(
+            connection.settings_dict, CONN_MAX_AGE=60
+        ):
+            run_concurrently(
+                self.closing(Tag.objects.count),
+                self.closing(Ingredient.objects.count),
+            )
+        self.assertEqual(stats['queries'], 2)
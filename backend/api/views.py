@@ -1,56 +1,124 @@
 """Функции для работы с рецептами и пользователями."""
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import (BooleanField, Count, F, OuterRef, Prefetch,
+                              Subquery, Sum, Value)
+from django.http import (Http404, HttpResponsePermanentRedirect,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_safe
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import status, viewsets
+from rest_framework import status, views, viewsets
 from rest_framework.decorators import action
-from rest_framework.pagination import LimitOffsetPagination
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 
 from core import functions
-from recipes.models import (FavoriteRecipes, Ingredient, Recipe, ShoppingCart,
-                            Tag)
+from core.constants import (INGREDIENT_SEARCH_LIMIT,
+                            INGREDIENT_SEARCH_MAX_LIMIT,
+                            SHOPPING_LIST_FILENAME, SHORT_LINK_MAX_AGE)
+from recipes.models import (FavoriteRecipes, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
 from users.models import Subscriptions
 
-from .filters import RecipeFilter
+from .asynchronous import AsyncViewSetMixin
+from .cache import (AnonymousResponseCacheMixin, ReferenceCacheMixin,
+                    ingredient_cache, recipe_response_cache, tag_cache)
+from .connections import connection_stats
+from .feed import subscription_feed
+from .filters import IngredientFilter, RecipeFilter, RecipeOrderingFilter
+from .metrics import registry
+from .paginations import FeedPagination, RecipesLimitPagination
 from .permissions import IsAuthorOrReadOnly
+from .renderers import FastJSONRenderer, PrometheusRenderer
+from .representations import RecipeRepresentation, RecipeRepresentationMixin
+from .search import ingredient_index
 from .serializers import (AvatarSerializer, FavoriteRecipesSerializer,
                           IngredientSerializer, RecipeCreateSerializer,
                           RecipeReadSerializer, RecipeSerializer,
-                          RecipeShoppingCartSerializer, RecipeShopSerializer,
+                          RecipeShoppingCartSerializer,
                           SubscribeCreateSerializer, SubscriptionSerializer,
                           TagSerializer, UserSerializer)
+from .shortlinks import short_link_resolver
 
 User = get_user_model()
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(AsyncViewSetMixin, ReferenceCacheMixin,
+                 viewsets.ReadOnlyModelViewSet):
     """ViewSet для модели Tag."""
 
+    reference_cache = tag_cache
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(AsyncViewSetMixin, ReferenceCacheMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """ViewSet для модели Ingredient."""
 
+    reference_cache = ingredient_cache
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     filter_backends = (DjangoFilterBackend,)
-    filterset_fields = ('name',)
+    filterset_class = IngredientFilter
 
+    def get_search_limit(self):
+        """Ограничение количества результатов поиска."""
+        try:
+            limit = int(self.request.query_params['limit'])
+        except (KeyError, ValueError):
+            return INGREDIENT_SEARCH_LIMIT
+        return max(1, min(limit, INGREDIENT_SEARCH_MAX_LIMIT))
+
+    def filter_queryset(self, queryset):
+        """Поиск по названию с ограничением количества результатов."""
+        queryset = super().filter_queryset(queryset)
+        if self.action == 'list' and self.request.query_params.get('name'):
+            return queryset[:self.get_search_limit()]
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """Без индексов в базе поиск идет по индексу в памяти."""
+        name = request.query_params.get('name')
+        if name and connection.vendor != 'postgresql':
+            return Response(
+                ingredient_index.search(name, self.get_search_limit())
+            )
+        return super().list(request, *args, **kwargs)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(AsyncViewSetMixin, AnonymousResponseCacheMixin,
+                    RecipeRepresentationMixin, viewsets.ModelViewSet):
     """ViewSet для модели Recipe."""
 
     queryset = Recipe.objects.all()
     filterset_class = RecipeFilter
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, RecipeOrderingFilter)
+    ordering_fields = ('id', 'favorites_count', 'in_carts_count')
+    ordering = ('-id',)
     permission_classes = (IsAuthorOrReadOnly,)
+    pagination_class = RecipesLimitPagination
+
+    def get_queryset(self):
+        """Рецепты с подгруженными связями.
+
+        Флаги is_favorited/is_in_shopping_cart/is_subscribed берутся
+        из membership_cache, поэтому запросы одинаковы для анонима
+        и пользователя.
+        """
+        return Recipe.objects.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        )
 
     def get_serializer_class(self):
         """Сериалайзер."""
@@ -67,10 +135,41 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def get_link(self, request, pk=None):
         """Получение короткой ссылки."""
-        id = self.get_object().id
-        return Response(
-            {'short-link': f'{settings.HOST}/{id}'}, status=status.HTTP_200_OK
+        path = reverse(
+            'short-link', args=[functions.to_base62(self.get_object().id)]
         )
+        if settings.SHORT_LINK_BASE_URL:
+            link = settings.SHORT_LINK_BASE_URL.rstrip('/') + path
+        else:
+            link = request.build_absolute_uri(path)
+        return Response({'short-link': link}, status=status.HTTP_200_OK)
+
+    @action(
+        methods=[
+            'get',
+        ],
+        detail=False,
+        permission_classes=[
+            IsAuthenticated,
+        ],
+        pagination_class=FeedPagination,
+    )
+    def feed(self, request):
+        """Рецепты авторов из подписок, новые сверху."""
+        ids = self.paginator.paginate_feed(subscription_feed, request)
+        if settings.FAST_RECIPE_REPRESENTATION:
+            data = RecipeRepresentation(request).represent(
+                RecipeRepresentation.queryset().filter(
+                    pk__in=ids
+                ).order_by('-id')
+            )
+        else:
+            data = RecipeReadSerializer(
+                self.get_queryset().filter(pk__in=ids).order_by('-id'),
+                many=True,
+                context=self.get_serializer_context(),
+            ).data
+        return self.paginator.get_paginated_response(data)
 
     def shop_fav_recipe(self, request, pk, serializer, model):
         """Базовая модель для списка покупок и избранных."""
@@ -135,18 +234,37 @@ class RecipeViewSet(viewsets.ModelViewSet):
             'get',
         ],
         detail=False,
+        permission_classes=[
+            IsAuthenticated,
+        ],
     )
     def download_shopping_cart(self, request):
         """Получение списка продуктов."""
-        user = request.user
-        recipes = Recipe.objects.filter(shoppingcart__user=user)
-        serializer = RecipeShopSerializer(
-            recipes, many=True, context={"request": request}
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in functions.SHOPPING_LIST_FORMATS:
+            return Response(
+                {'file_format': 'Доступные форматы: '
+                 f'{", ".join(functions.SHOPPING_LIST_FORMATS)}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        generator, content_type = functions.SHOPPING_LIST_FORMATS[
+            file_format
+        ]
+        ingredients = RecipeIngredient.objects.filter(
+            recipe__shoppingcart__user=request.user
+        ).values(
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit'),
+        ).annotate(
+            total_amount=Sum('amount')
+        ).order_by('name')
+        response = StreamingHttpResponse(
+            generator(ingredients.iterator()), content_type=content_type
         )
-        data = functions.txt_file(serializer.data)
-        return Response(
-            data, content_type='text/plain', status=status.HTTP_200_OK
+        response['Content-Disposition'] = (
+            f'attachment; filename="{SHOPPING_LIST_FILENAME}.{file_format}"'
         )
+        return response
 
 
 class UserViewSet(viewsets.GenericViewSet):
@@ -228,20 +346,70 @@ class UserViewSet(viewsets.GenericViewSet):
             'get',
         ],
         detail=False,
+        permission_classes=[
+            IsAuthenticated,
+        ],
     )
     def subscriptions(self, request):
         """Список подписок."""
-        paginator = LimitOffsetPagination()
-        subscriptions = Subscriptions.objects.filter(subscriber=request.user)
-        users = [subscription.user for subscription in subscriptions]
-
-        paginated_users = paginator.paginate_queryset(
-            users, request, view=self
-        )
         recipes_limit = request.query_params.get('recipes_limit')
+        recipes = Recipe.objects.all()
+        if recipes_limit and recipes_limit.isdigit():
+            recipes = recipes.filter(id__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).values('id')[:int(recipes_limit)]
+            ))
+        users = User.objects.filter(
+            subscribers__subscriber=request.user
+        ).annotate(
+            recipes_count=Count('recipes'),
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes)
+        )
+        page = self.paginate_queryset(users)
         serializer = SubscriptionSerializer(
-            paginated_users,
+            page,
             many=True,
             context={'request': request, 'recipes_limit': recipes_limit},
         )
-        return paginator.get_paginated_response(serializer.data)
+        return self.get_paginated_response(serializer.data)
+
+
+@require_safe
+def short_link(request, code):
+    """Переход по короткой ссылке на страницу рецепта."""
+    pk = short_link_resolver.resolve(code)
+    if pk is None:
+        raise Http404
+    response = HttpResponsePermanentRedirect(f'/recipes/{pk}')
+    patch_cache_control(response, public=True, max_age=SHORT_LINK_MAX_AGE)
+    return response
+
+
+class MetricsView(views.APIView):
+    """Метрики обработчиков для персонала; ?format=prometheus - текстом."""
+
+    permission_classes = (IsAdminUser,)
+    renderer_classes = (FastJSONRenderer, PrometheusRenderer)
+
+    def get(self, request):
+        """Сводка метрик процесса."""
+        counters = {
+            **{
+                f'response_cache_{name}_total': value
+                for name, value in recipe_response_cache.stats().items()
+            },
+            **{
+                f'db_{name}_total': value
+                for name, value in connection_stats.snapshot().items()
+            },
+        }
+        if request.accepted_renderer.format == PrometheusRenderer.format:
+            return Response(registry.prometheus(counters))
+        return Response({
+            'enabled': settings.REQUEST_METRICS,
+            'endpoints': registry.snapshot(),
+            **counters,
+        })
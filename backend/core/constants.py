@@ -5,3 +5,30 @@ INGR_NAME_MAX_LENGHT = 128
 INGR_UNIT_MAX_LENGHT = 64
 RECIPE_NAME_MAX_LENGHT = 256
 FIRST_LAST_NAME = 150
+SHOPPING_LIST_FILENAME = 'shopping_list'
+INGREDIENT_SEARCH_LIMIT = 20
+INGREDIENT_SEARCH_MAX_LIMIT = 100
+INGREDIENT_INDEX_TTL = 300
+RECIPES_MAX_PAGE_SIZE = 100
+IMAGE_MAX_SIDE = 1600
+IMAGE_QUALITY = 85
+IMAGE_VARIANT_WIDTHS = (300, 600, 1200)
+IMAGE_THUMBNAIL_SIZE = (150, 150)
+RECIPE_IMAGES_DIR = 'api/images/'
+AVATARS_DIR = 'avatars/'
+IMAGE_STATUS_MAX_LENGHT = 16
+BASE62_ALPHABET = (
+    '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+)
+SHORT_LINK_PREFIX = 's'
+SHORT_LINK_CACHE_SIZE = 4096
+SHORT_LINK_MAX_AGE = 60 * 60 * 24
+BENCHMARK_EMAIL_DOMAIN = 'benchmark.local'
+BENCHMARK_PASSWORD = 'benchmark-password'
+RECIPE_SEARCH_CONFIG = 'russian'
+RECIPE_SEARCH_INDEX_TTL = 300
+RECIPE_COVERAGE_MAX_INGREDIENTS = 50
+FEED_FANOUT_MAX_SUBSCRIBERS = 1000
+FEED_READ_AUTHORS_TTL = 300
+FEED_BACKFILL_RECIPES = 100
+CONCURRENT_QUERY_THREADS = 8
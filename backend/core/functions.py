@@ -1,17 +1,99 @@
 """Функции."""
+import csv
+import io
+import os
 
+from django.conf import settings
 
-def txt_file(data):
-    """Функция переводит из json для получения списка продуктов."""
-    result = []
-    for item in data:
-        name = item['name']
-        ingredients_data = item['ingredients']
-        ingredients = []
-        for ingredient in ingredients_data:
-            amount = ingredient['amount']
-            ingredient_select = ingredient['name']
-            unit = ingredient['measurement_unit']
-            ingredients.append(f'{ingredient_select} - {amount} {unit}')
-        result.append(f'{name}:{", ".join(ingredients)}')
-        return result
+from .constants import BASE62_ALPHABET
+
+
+def to_base62(number):
+    """Неотрицательное число в base62."""
+    if number < 0:
+        raise ValueError('Число должно быть неотрицательным.')
+    digits = []
+    while True:
+        number, digit = divmod(number, len(BASE62_ALPHABET))
+        digits.append(BASE62_ALPHABET[digit])
+        if not number:
+            return ''.join(reversed(digits))
+
+
+def from_base62(code):
+    """Число из base62; ValueError для некорректного кода."""
+    if not code or (len(code) > 1 and code[0] == BASE62_ALPHABET[0]):
+        raise ValueError(f'Некорректный код: {code!r}.')
+    number = 0
+    for char in code:
+        digit = BASE62_ALPHABET.find(char)
+        if digit < 0:
+            raise ValueError(f'Некорректный код: {code!r}.')
+        number = number * len(BASE62_ALPHABET) + digit
+    return number
+
+
+class Echo:
+    """Псевдо-файл, возвращающий записанную строку (для csv.writer)."""
+
+    def write(self, value):
+        """Возвращает строку вместо записи."""
+        return value
+
+
+def shopping_list_txt(ingredients):
+    """Построчно отдает список покупок в текстовом виде."""
+    yield 'Список покупок:\n'
+    for number, item in enumerate(ingredients, start=1):
+        yield (
+            f'{number}. {item["name"]} '
+            f'({item["measurement_unit"]}) - {item["total_amount"]}\n'
+        )
+
+
+def shopping_list_csv(ingredients):
+    """Построчно отдает список покупок в формате CSV."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Единица измерения', 'Количество'))
+    for item in ingredients:
+        yield writer.writerow(
+            (item['name'], item['measurement_unit'], item['total_amount'])
+        )
+
+
+def shopping_list_pdf(ingredients):
+    """Список покупок в формате PDF."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    font = 'Helvetica'
+    if os.path.exists(settings.SHOPPING_LIST_FONT):
+        font = 'ShoppingListFont'
+        if font not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(
+                TTFont(font, settings.SHOPPING_LIST_FONT)
+            )
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    top = height - 50
+    y = top
+    pdf.setFont(font, 12)
+    for line in shopping_list_txt(ingredients):
+        if y < 50:
+            pdf.showPage()
+            pdf.setFont(font, 12)
+            y = top
+        pdf.drawString(50, y, line.rstrip('\n'))
+        y -= 18
+    pdf.save()
+    yield buffer.getvalue()
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': (shopping_list_txt, 'text/plain; charset=utf-8'),
+    'csv': (shopping_list_csv, 'text/csv; charset=utf-8'),
+    'pdf': (shopping_list_pdf, 'application/pdf'),
+}
@@ -0,0 +1,157 @@
+"""Обработка загружаемых изображений."""
+import hashlib
+import io
+import os
+import re
+
+import filetype
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from core.constants import (IMAGE_MAX_SIDE, IMAGE_QUALITY,
+                            IMAGE_THUMBNAIL_SIZE, IMAGE_VARIANT_WIDTHS)
+
+ALLOWED_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+ALLOWED_EXTENSIONS = ('jpg', 'png', 'gif', 'webp')
+RAW_DIR = 'raw/'
+HASHED_NAME = re.compile(r'^(?P<base>(?:.*/)?[0-9a-f]{32})\.jpg$')
+
+
+class ImageUpload(ContentFile):
+    """Проверенное, но еще не сохраненное изображение.
+
+    image - уже декодированное изображение, чтобы save_image
+    не декодировал его повторно.
+    """
+
+    def __init__(self, data, image=None):
+        """Байты загрузки и декодированное изображение, если есть."""
+        super().__init__(data)
+        self.image = image
+
+    def __bool__(self):
+        """Непустая загрузка (у ContentFile без имени bool - False)."""
+        return bool(self.size)
+
+
+def open_image(data):
+    """Декодирование изображения (единственное за всю обработку)."""
+    image = Image.open(io.BytesIO(data))
+    if image.format not in ALLOWED_FORMATS:
+        raise OSError(f'Неподдерживаемый формат {image.format}.')
+    image.load()
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    else:
+        image = image.convert('RGB')
+    image.info = {}
+    return image
+
+
+def encode(image, image_format):
+    """Изображение в файл без метаданных."""
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, quality=IMAGE_QUALITY, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def resize_to_width(image, width):
+    """Уменьшение до ширины width с сохранением пропорций."""
+    if image.width <= width:
+        return image
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def variant_names(name):
+    """Имена вариантов для файла с хэшем в имени."""
+    match = HASHED_NAME.match(name or '')
+    if match is None:
+        return {}
+    base = match['base']
+    names = {str(width): f'{base}_{width}.webp'
+             for width in IMAGE_VARIANT_WIDTHS}
+    names['thumbnail'] = f'{base}_thumb.webp'
+    return names
+
+
+def content_hash(data):
+    """Хэш содержимого файла."""
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def original_name(data, upload_to):
+    """Имя файла по хэшу содержимого."""
+    return f'{upload_to}{content_hash(data)}.jpg'
+
+
+def save_variants(image, name):
+    """Сохранение уменьшенных WebP-вариантов и миниатюры."""
+    for key, variant_name in variant_names(name).items():
+        if default_storage.exists(variant_name):
+            continue
+        if key == 'thumbnail':
+            variant = ImageOps.fit(image, IMAGE_THUMBNAIL_SIZE, Image.LANCZOS)
+        else:
+            variant = resize_to_width(image, int(key))
+        default_storage.save(variant_name, encode(variant, 'WEBP'))
+
+
+def save_image(data, upload_to, image=None):
+    """Сохранение изображения и его вариантов, возвращает имя файла.
+
+    Одинаковые изображения сохраняются один раз: имя файла - хэш
+    исходных байтов. image - уже декодированные data.
+    """
+    name = original_name(data, upload_to)
+    if default_storage.exists(name):
+        return name
+    if image is None:
+        image = open_image(data)
+    image.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE), Image.LANCZOS)
+    save_variants(image, name)
+    return default_storage.save(name, encode(image, 'JPEG'))
+
+
+def is_raw_name(name):
+    """Файл еще не обработан."""
+    return f'/{RAW_DIR}' in f'/{name}'
+
+
+def upload_extension(data):
+    """Расширение файла по содержимому; OSError для других форматов."""
+    extension = filetype.guess_extension(data)
+    if extension not in ALLOWED_EXTENSIONS:
+        raise OSError('Неподдерживаемый формат изображения.')
+    return extension
+
+
+def store_upload(data, upload_to):
+    """Сохранение загрузки без декодирования, возвращает имя файла.
+
+    Если такое изображение уже обработано, возвращается имя готового
+    файла, иначе - имя исходного файла в каталоге raw/, который затем
+    обрабатывается process_upload.
+    """
+    name = original_name(data, upload_to)
+    if default_storage.exists(name):
+        return name
+    extension = upload_extension(data)
+    raw_name = f'{upload_to}{RAW_DIR}{content_hash(data)}.{extension}'
+    if default_storage.exists(raw_name):
+        return raw_name
+    return default_storage.save(raw_name, ContentFile(data))
+
+
+def process_upload(raw_name):
+    """Обработка исходного файла, возвращает имя готового файла."""
+    upload_to = os.path.dirname(os.path.dirname(raw_name))
+    if upload_to:
+        upload_to += '/'
+    with default_storage.open(raw_name) as file:
+        return save_image(file.read(), upload_to)
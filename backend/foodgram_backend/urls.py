@@ -1,8 +1,16 @@
 """foodgram_backend URL Configuration."""
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
+
+from api.views import short_link
+from core.constants import SHORT_LINK_PREFIX
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include("api.urls")),
+    re_path(
+        rf'^{SHORT_LINK_PREFIX}/(?P<code>[0-9a-zA-Z]+)/?$',
+        short_link,
+        name='short-link',
+    ),
 ]
@@ -18,13 +18,9 @@ class RecipeIngredientInline(admin.TabularInline):
 class RecipeAdmin(admin.ModelAdmin):
     """Админка рецептов."""
 
-    list_display = ('id', 'name', 'get_favorite_count')
+    list_display = ('id', 'name', 'favorites_count', 'in_carts_count')
     inlines = [RecipeIngredientInline]
 
-    def get_favorite_count(self, obj):
-        """Получение количества избранных."""
-        return obj.favoriterecipes.count()
-
 
 admin.site.register(Tag)
 admin.site.register(Ingredient)
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.3 on 2026-10-18 16:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_image_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favoriterecipes',
+            index=models.Index(fields=['recipe', 'user'], name='favoriterecipes_rcp_usr_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(fields=['recipe', 'user'], name='shoppingcart_rcp_usr_idx'),
+        ),
+    ]
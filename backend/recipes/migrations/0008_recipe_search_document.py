@@ -0,0 +1,67 @@
+# Generated by Django 3.2.3 on 2026-10-18 17:06
+
+from collections import defaultdict
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+CREATE_INDEX = (
+    'CREATE INDEX IF NOT EXISTS recipes_search_vector_idx '
+    'ON recipes_recipesearchdocument USING gin (vector)'
+)
+FILL_VECTORS = (
+    "UPDATE recipes_recipesearchdocument AS document SET vector = "
+    "setweight(to_tsvector('russian', recipe.name), 'A') || "
+    "setweight(to_tsvector('russian', document.ingredients), 'B') || "
+    "setweight(to_tsvector('russian', recipe.text), 'C') "
+    "FROM recipes_recipe AS recipe WHERE recipe.id = document.recipe_id"
+)
+
+
+def fill_documents(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    RecipeSearchDocument = apps.get_model('recipes', 'RecipeSearchDocument')
+    names = defaultdict(list)
+    for recipe_id, name in RecipeIngredient.objects.order_by(
+        'recipe_id', 'ingredient__name'
+    ).values_list('recipe_id', 'ingredient__name').iterator():
+        names[recipe_id].append(name)
+    RecipeSearchDocument.objects.bulk_create(
+        (
+            RecipeSearchDocument(
+                recipe_id=recipe_id, ingredients=' '.join(names[recipe_id])
+            )
+            for recipe_id in Recipe.objects.values_list(
+                'pk', flat=True
+            ).iterator()
+        ),
+        batch_size=1000,
+    )
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_INDEX)
+        schema_editor.execute(FILL_VECTORS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearchDocument',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='recipes.recipe')),
+                ('ingredients', models.TextField(blank=True)),
+                ('vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+            ],
+            options={
+                'verbose_name': 'Поисковый документ рецепта',
+                'verbose_name_plural': 'Поисковые документы рецептов',
+            },
+        ),
+        migrations.RunPython(fill_documents, migrations.RunPython.noop),
+    ]
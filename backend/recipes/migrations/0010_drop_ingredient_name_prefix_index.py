@@ -0,0 +1,30 @@
+# Generated by Django 3.2.3 on 2026-10-18 19:02
+
+from django.db import migrations
+
+DROP_INDEX = 'DROP INDEX IF EXISTS recipes_ingredient_name_prefix_idx'
+CREATE_INDEX = (
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_prefix_idx '
+    'ON recipes_ingredient (UPPER(name::text) text_pattern_ops)'
+)
+
+
+def run_on_postgresql(statement):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_feed_entry'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_postgresql(DROP_INDEX),
+            run_on_postgresql(CREATE_INDEX),
+        ),
+    ]
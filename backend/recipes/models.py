@@ -1,10 +1,12 @@
 """Модели рецептов и все что с ними связано."""
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
 
-from core.constants import (INGR_NAME_MAX_LENGHT, INGR_UNIT_MAX_LENGHT,
-                            RECIPE_NAME_MAX_LENGHT, TAG_MAX_LENGHT)
+from core.constants import (IMAGE_STATUS_MAX_LENGHT, INGR_NAME_MAX_LENGHT,
+                            INGR_UNIT_MAX_LENGHT, RECIPE_NAME_MAX_LENGHT,
+                            TAG_MAX_LENGHT)
 
 User = get_user_model()
 
@@ -46,6 +48,13 @@ class Ingredient(models.Model):
 class Recipe(models.Model):
     """Модель рецептов."""
 
+    class ImageStatus(models.TextChoices):
+        """Состояние обработки изображения."""
+
+        PENDING = 'pending', 'Обрабатывается'
+        READY = 'ready', 'Готово'
+        FAILED = 'failed', 'Ошибка'
+
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -55,17 +64,39 @@ class Recipe(models.Model):
     image = models.ImageField(
         upload_to='api/images/',
     )
+    image_status = models.CharField(
+        max_length=IMAGE_STATUS_MAX_LENGHT,
+        choices=ImageStatus.choices,
+        default=ImageStatus.READY,
+    )
     name = models.CharField(max_length=RECIPE_NAME_MAX_LENGHT)
     text = models.TextField()
     cooking_time = models.PositiveIntegerField(
         validators=[MinValueValidator(1)]
     )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'В списках покупок', default=0, editable=False
+    )
 
     class Meta:
         """Meta."""
 
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        ordering = ('-id',)
+        indexes = [
+            models.Index(
+                fields=['author', '-id'],
+                name='recipe_author_id_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_favorites_count_idx'
+            ),
+        ]
 
     def __str__(self):
         """Имя."""
@@ -103,6 +134,33 @@ class RecipeIngredient(models.Model):
         return f'{self.ingredient} {self.recipe} {self.amount}'
 
 
+class RecipeSearchDocument(models.Model):
+    """Поисковый документ рецепта.
+
+    Названия ингредиентов хранятся строкой; на PostgreSQL vector
+    собирается из названия, ингредиентов и описания с весами A, B, C.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_document'
+    )
+    ingredients = models.TextField(blank=True)
+    vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        """Meta."""
+
+        verbose_name = 'Поисковый документ рецепта'
+        verbose_name_plural = 'Поисковые документы рецептов'
+
+    def __str__(self):
+        """Имя."""
+        return str(self.recipe)
+
+
 class BaseShopAndFavorite(models.Model):
     """Абстрактная модель списка покупок и избранных."""
 
@@ -123,6 +181,12 @@ class BaseShopAndFavorite(models.Model):
                 name='%(class)s_unique_user_recipe'
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'],
+                name='%(class)s_rcp_usr_idx'
+            ),
+        ]
 
     def __str__(self):
         """Имя."""
@@ -132,6 +196,8 @@ class BaseShopAndFavorite(models.Model):
 class ShoppingCart(BaseShopAndFavorite):
     """Модель списка покупок."""
 
+    counter_field = 'in_carts_count'
+
     class Meta(BaseShopAndFavorite.Meta):
         """Meta."""
 
@@ -143,9 +209,53 @@ class ShoppingCart(BaseShopAndFavorite):
 class FavoriteRecipes(BaseShopAndFavorite):
     """Модель избранных рецептов."""
 
+    counter_field = 'favorites_count'
+
     class Meta(BaseShopAndFavorite.Meta):
         """Meta."""
 
         verbose_name = 'Избранный рецепт пользователя.'
         verbose_name_plural = 'Избранные рецепты пользователей.'
         db_table = 'favorite_recipes'
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписок пользователя.
+
+    Заполняется при публикации рецепта (fan-out on write); рецепты
+    авторов с большим числом подписчиков сюда не попадают и читаются
+    при запросе ленты.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+
+    class Meta:
+        """Meta."""
+
+        verbose_name = 'Рецепт в ленте подписок'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_user_recipe'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'],
+                name='feedentry_rcp_usr_idx'
+            ),
+        ]
+
+    def __str__(self):
+        """Имя."""
+        return f'{self.recipe} - {self.user}'
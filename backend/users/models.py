@@ -70,6 +70,12 @@ class Subscriptions(models.Model):
                 name='unique_user_subscriber'
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['subscriber', 'user'],
+                name='subscriber_user_idx'
+            ),
+        ]
 
     def __str__(self):
         """Имя."""